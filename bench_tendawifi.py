@@ -0,0 +1,71 @@
+"""
+Benchmarks of the client against the fake router. Requires pytest-benchmark:
+
+    $ python -m pytest bench_tendawifi.py --benchmark-columns=mean,median,ops
+"""
+import pytest
+import tendawifi
+from tendawifi.simulator import FakeAC15
+
+pytest.importorskip("pytest_benchmark")
+
+GETTERS = ["get_online_list", "get_net_control", "get_ipmac_bind", "get_vports", "get_router_status"]
+
+
+@ pytest.fixture(scope="module", params=[10, 250], ids=lambda n: f"{n}clients")
+def fake_router(request):
+    with FakeAC15(password="1234", clients=request.param, latency=0.002) as router:
+        yield router
+
+
+@ pytest.fixture
+def tenda(fake_router):
+    with tendawifi.TendaAC15(fake_router.url, "1234") as client:
+        yield client
+
+
+def _report(benchmark, tenda, calls):
+    benchmark.extra_info["logins_per_call"] = tenda.stats["logins"] / calls
+    benchmark.extra_info["requests_per_call"] = tenda.stats["requests"] / calls
+
+
+@ pytest.mark.parametrize("method", GETTERS)
+def test_getter(benchmark, tenda, method):
+    calls = []
+    benchmark(lambda: calls.append(getattr(tenda, method)()))
+    _report(benchmark, tenda, len(calls))
+
+
+def test_set_net_control(benchmark, tenda):
+    net_control = tenda.get_net_control()
+    calls = []
+    benchmark(lambda: calls.append(tenda.set_net_control(net_control)))
+    _report(benchmark, tenda, len(calls))
+
+
+def test_apply_net_control_noop(benchmark, tenda):
+    net_control = tenda.get_net_control()
+    calls = []
+    benchmark(lambda: calls.append(tenda.apply_net_control(net_control)))
+    _report(benchmark, tenda, len(calls))
+
+
+def test_snapshot_queries(benchmark, tenda):
+    def run():
+        snapshot = tenda.snapshot()
+        for client in snapshot.online():
+            snapshot.by_ip(client["ip"])
+        snapshot.by_iprange(100, 150)
+    benchmark(run)
+
+
+def test_fleet_throughput(benchmark, fake_router):
+    routers = [FakeAC15(password="1234", clients=len(fake_router.online_list), latency=0.002).start() for _ in range(16)]
+    try:
+        with tendawifi.TendaFleet([(r.url, "1234") for r in routers], max_workers=8) as fleet:
+            results = benchmark(fleet.run, "get_router_status")
+            assert all(r.error is None for r in results.values())
+            benchmark.extra_info["routers"] = len(fleet)
+    finally:
+        for router in routers:
+            router.stop()
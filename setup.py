@@ -18,7 +18,7 @@ with open("README.md", "r") as fh:
     long_description = fh.read()
 
 requires = [
-    'reqtry>=0.0.2,<1.0'
+    'requests>=2.20,<3'
 ]
 
 setuptools.setup(
@@ -36,6 +36,14 @@ setuptools.setup(
         "License :: OSI Approved :: MIT License",
         "Operating System :: OS Independent",
     ],
-    python_requires='>=3.6',
+    # Lazy module attributes (PEP 562) and the simulator's ThreadingHTTPServer need 3.7.
+    python_requires='>=3.7',
     install_requires=requires,
+    extras_require={
+        'async': ['aiohttp>=3.7'],
+        'analytics': ['numpy>=1.17'],
+    },
+    entry_points={
+        'console_scripts': ['tendawifi=tendawifi.cli:main'],
+    },
 )
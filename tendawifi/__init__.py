@@ -1,70 +1,238 @@
 import logging
-import hashlib
-import reqtry
-import re
-from getpass import getpass
+import threading
+import time
+import requests
+from . import forms
+from .credentials import resolve_password, DEFAULT_PASSWORD_ENV
+from .cache import TTLCache
+from .diff import ConfigDiff, diff_net_control, diff_ipmac_bind, diff_vports
+from .metrics import RequestEvent, LatencyCollector
+from .retry import RetryPolicy, CircuitBreaker, CircuitOpenError
+from .singleflight import SingleFlight
 logger = logging.getLogger(__name__)
 
+# Optional layers, imported on first access to keep 'import tendawifi' fast.
+_LAZY = {
+    'ClientSnapshot': 'snapshot',
+    'Poller': 'telemetry', 'ClientSample': 'telemetry', 'WanSample': 'telemetry',
+    'PresenceTracker': 'presence', 'PresenceEvent': 'presence',
+    'TendaFleet': 'fleet', 'FleetResult': 'fleet',
+    'OnlineClient': 'models', 'BindEntry': 'models', 'NetControlRow': 'models', 'VirtualServer': 'models',
+    'RouterStatus': 'models',
+    'ProbeResult': 'probe',
+}
+
+
+def __getattr__(name: str):
+    if name in _LAZY:
+        import importlib
+        value = getattr(importlib.import_module('.' + _LAZY[name], __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 class TendaAC15():
-    _AUTH_DATA = {'username': 'admin',
-                  'password': ''}
+    """
+    Client of a Tenda AC15 router. Building it is cheap and does no I/O: the password is resolved,
+    and the connection pool created, on the first request.
+    Args:
+        url_base:str: Router url ex: "http://192.168.1.1"
+        password:str|callable|provider: Router password, a function returning it, or a keyring-style provider
+                                        ex: the keyring module. If not set, password_env is read, then the user
+                                        is prompted when running in a terminal.
+        password_env:str: Environment variable with the password.
+        max_concurrent:int: Max requests sent to the router at the same time. pool_size if not set.
+    Identical GET requests made at the same time by many threads are sent once, and share the response.
+    """
+    _USERNAME = 'admin'
 
-    def __init__(self, url_base='http://192.168.1.1', password=None):
-        self._AUTH_DATA["password"] = hashlib.md5(
-            str.encode(getpass())).hexdigest() if not password else hashlib.md5(
-            str.encode(password)).hexdigest()
+    def __init__(self, url_base='http://192.168.1.1', password=None, pool_size: int = 4, timeout=(3, 3), login_timeout=(5, 5),
+                 cache_ttl=None, observers: list = None, retry: RetryPolicy = None, password_env: str = DEFAULT_PASSWORD_ENV,
+                 max_concurrent: int = None):
         self._URL_BASE = url_base
-        self._URLS = {
-            'login': self._URL_BASE+'/login/Auth',
-            'GetParentControl': self._URL_BASE+'/goform/GetParentControlInfo?mac=',
-            'SetParentControl': self._URL_BASE+'/goform/saveParentControlInfo',
-            'GetVports': self._URL_BASE+'/goform/GetVirtualServerCfg',
-            'SetVports': self._URL_BASE+'/goform/SetVirtualServerCfg',
-            'GetNetControl': self._URL_BASE+'/goform/GetNetControlList',
-            'SetNetControl': self._URL_BASE+'/goform/SetNetControlList',
-            'GetIpMacBind': self._URL_BASE+'/goform/GetIpMacBind',
-            'SetIpMacBind': self._URL_BASE+'/goform/SetIpMacBind',
-            'GetOnlineList': self._URL_BASE+'/goform/getOnlineList',
-            'SysToolReboot': self._URL_BASE+'/goform/SysToolReboot',
-            'SetWPS': self._URL_BASE+'/goform/WifiWpsSet',
-            'SetupWIFI': self._URL_BASE+'/goform/WifiBasicSet',
-            'SetAutoreboot': self._URL_BASE+'/goform/SetSysAutoRebbotCfg',
-            'SetSysPass': self._URL_BASE+'/goform/SysToolChangePwd',
-            'SetFastInternet': self._URL_BASE+'/goform/fast_setting_internet_set',
-            'SetFastRouter': self._URL_BASE+'/goform/fast_setting_wifi_set',
-            'GetRouterStatus': self._URL_BASE+'/goform/GetRouterStatus'
-        }
-
-    def _get_cookies(self):
+        # Each instance keeps its own credentials, so clients of routers with different passwords can be used side by side.
+        self._password = password
+        self._password_env = password_env
+        self._auth_data = None
+        self._urls = None
+        self._cache = TTLCache(cache_ttl) if cache_ttl else None
+        self._cookies = None
+        self.stats = {'logins': 0, 'requests': 0}
+        # timeout and login_timeout are shortcuts for the default policy.
+        self._retry = retry or RetryPolicy(timeout=timeout, timeouts={'login': login_timeout})
+        self._breaker = self._retry.breaker()
+        self._pool_size = pool_size
+        self._http = None
+        self._lock = threading.Lock()
+        self._login_lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_concurrent or pool_size)
+        self._gets = SingleFlight()
+        self._observers = list(observers or [])
+
+    @property
+    def _AUTH_DATA(self) -> dict:
+        if self._auth_data is None:
+            password = resolve_password(self._password, self._URL_BASE, self._password_env)
+            self._auth_data = {'username': self._USERNAME, 'password': forms.md5(password)}
+        return self._auth_data
+
+    @property
+    def _URLS(self) -> dict:
+        if self._urls is None:
+            self._urls = {name: self._URL_BASE + path for name, path in forms.PATHS.items()}
+        return self._urls
+
+    @property
+    def _session(self) -> requests.Session:
+        if self._http is None:
+            with self._lock:
+                if self._http is None:
+                    session = requests.Session()
+                    adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=self._pool_size)
+                    session.mount('http://', adapter)
+                    session.mount('https://', adapter)
+                    self._http = session
+        return self._http
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
         """
-        Get cookies to make requests.
+        Close the pooled connections to the router.
+        """
+        if self._http is not None:
+            self._http.close()
+            self._http = None
+
+    def add_observer(self, observer):
         """
-        tries = 3
-        while tries:
+        Add a callable called with a RequestEvent on every login, request start and end, retry and failure.
+        """
+        self._observers.append(observer)
+
+    def remove_observer(self, observer):
+        self._observers.remove(observer)
+
+    def _emit(self, kind: str, method: str, url: str, start: float = None, r=None, attempt: int = 0, error=None):
+        if not self._observers:
+            return
+        r = r if r is not None else getattr(error, 'response', None)
+        event = RequestEvent(kind, self._URL_BASE, forms.endpoint(url), method,
+                             time.monotonic() - start if start is not None else None,
+                             len(getattr(r, 'content', None) or b''), getattr(r, 'status_code', None), attempt, error)
+        for observer in self._observers:
+            try:
+                observer(event)
+            except Exception:
+                logger.exception('Observer %r failed.', observer)
+
+    def _deadline(self) -> float:
+        """
+        Return the clock time a call following the retry policy must end by, or None if unlimited.
+        """
+        return time.monotonic() + self._retry.deadline if self._retry.deadline else None
+
+    def _request(self, method: str, url: str, deadline: float = None, **kwargs):
+        """
+        Send a request over the pooled session following the retry policy.
+        Connection errors and 5xx responses are retried with backoff, within the deadline of the whole call
+        (see _deadline()), or the policy deadline from now if not given.
+        """
+        policy = self._retry
+        if deadline is None:
+            deadline = self._deadline()
+        if self._breaker is not None and not self._breaker.allow():
+            error = CircuitOpenError(f"Circuit open for {self._URL_BASE}, failing fast.")
+            self._emit('failure', method, url, error=error)
+            raise error
+        endpoint = forms.endpoint(url)
+        delay = policy.delay
+        attempt = 0
+        while True:
+            attempt += 1
             try:
-                cookies = reqtry.post(self._URLS['login'], data=self._AUTH_DATA,
-                                      allow_redirects=False, timeout=(5, 5), tries=3, delay=1,
-                                      backoff=1.5, jitter=(1, 1.5))
-                assert cookies.status_code == 302, f"Invalid http status code: {cookies.status_code}"
-                assert bool(cookies.cookies), "Cookies are empty."
-                self._cookies = cookies.cookies
-                return
-            except:
-                tries -= 1
-                if not tries:
-                    self._cookies = None
+                # Waiting for a free slot counts against the deadline, not against the request latency.
+                with self._slots:
+                    start = time.monotonic()
+                    timeout = policy.timeout_for(endpoint, deadline - start if deadline else None)
+                    self._emit('request_start', method, url, attempt=attempt)
+                    r = self._session.request(method, url, allow_redirects=False, timeout=timeout, **kwargs)
+                if r.status_code >= 500:
+                    r.raise_for_status()
+                if self._breaker is not None:
+                    self._breaker.record_success()
+                self._emit('request_end', method, url, start, r, attempt)
+                return r
+            except requests.RequestException as e:
+                if attempt >= policy.tries or (deadline and time.monotonic() + delay >= deadline):
+                    if self._breaker is not None:
+                        self._breaker.record_failure()
+                    self._emit('failure', method, url, start, attempt=attempt, error=e)
                     raise
+                self._emit('retry', method, url, start, attempt=attempt, error=e)
+                logger.warning('%s, retrying in %s seconds...', e, delay)
+                time.sleep(delay)
+                delay = policy.next_delay(delay)
+
+    def _get_cookies(self, deadline: float = None):
+        """
+        Get cookies to make requests.
+        """
+        # Transport errors are already retried by _request, and a rejected password won't get better by retrying.
+        start = time.monotonic()
+        cookies = self._request('POST', self._URLS['login'], deadline=deadline, data=self._AUTH_DATA)
+        self.stats['logins'] += 1
+        self._emit('login', 'POST', self._URLS['login'], start, cookies)
+        assert cookies.status_code == 302, f"Invalid http status code: {cookies.status_code}"
+        assert bool(cookies.cookies), "Cookies are empty."
+        self._cookies = cookies.cookies
+
+    def _ensure_cookies(self, stale=None, deadline: float = None):
+        """
+        Login only if there is no session cookie yet, or it's the stale one. Threads finding the session
+        missing at the same time wait for a single login.
+        """
+        if self._cookies and self._cookies is not stale:
+            return
+        with self._login_lock:
+            if not self._cookies or self._cookies is stale:
+                self._get_cookies(deadline)
+
+    @staticmethod
+    def _session_expired(r) -> bool:
+        """
+        Return whether a response means the router dropped the session.
+        """
+        if r.status_code in (301, 302, 401):
+            return True
+        text = getattr(r, 'text', None) or ''
+        return 'login.html' in text[:512].lower()
 
     def _req_get(self, url: str):
         """
-        Return a request object of a GET request.
+        Return a request object of a GET request, shared with the threads requesting the same url meanwhile.
         """
-        self._get_cookies()
+        return self._gets.do(url, self._send_get, url)
+
+    def _send_get(self, url: str):
+        # One deadline for the whole call: login, session renewal and retries included.
+        deadline = self._deadline()
+        self._ensure_cookies(deadline=deadline)
         if not self._cookies:
             return
-        r = reqtry.get(url, cookies=self._cookies, allow_redirects=False, timeout=(3, 3), tries=3, delay=1,
-                       backoff=1.5, jitter=(1, 1.5))
+        for attempt in range(2):
+            cookies = self._cookies
+            r = self._request('GET', url, deadline=deadline, cookies=cookies)
+            self.stats['requests'] += 1
+            if attempt or not self._session_expired(r):
+                break
+            logger.debug("Session expired, logging in again.")
+            self._ensure_cookies(cookies, deadline)
         assert r.status_code == 200, f"Get request: Invalid http status code: {r.status_code}"
         return r
 
@@ -75,15 +243,58 @@ class TendaAC15():
         r = self._req_get(url)
         return r.json() if r else None
 
+    def _get_cached(self, endpoint: str, refresh: bool = False):
+        """
+        Return the JSON of a GET endpoint, from the cache when it's enabled and fresh.
+        """
+        if self._cache is None or not self._cache.ttl(endpoint):
+            return self._get_json(self._URLS[endpoint])
+        if not refresh:
+            hit, value = self._cache.get(endpoint)
+            if hit:
+                return value
+        value = self._get_json(self._URLS[endpoint])
+        self._cache.set(endpoint, value)
+        return value
+
+    def invalidate(self, *endpoints):
+        """
+        Drop cached responses of the given endpoints ex: "GetOnlineList", or all of them if none is given.
+        """
+        if self._cache is not None:
+            self._cache.invalidate(*endpoints)
+
+    @property
+    def cache_stats(self) -> dict:
+        """
+        Return cache statistics ex: {'hits': 3, 'misses': 1, 'entries': 1}
+        """
+        return self._cache.stats if self._cache is not None else {'hits': 0, 'misses': 0, 'entries': 0}
+
+    def _invalidate_for(self, url: str):
+        name = forms.endpoint(url)
+        if name in forms.INVALIDATES:
+            endpoints = forms.INVALIDATES[name]
+            self.invalidate(*(endpoints or ()))
+
     def _req_post(self, url: str, data, raw_res: bool = False):
         """
         Return the POST request response in text format.
         """
-        self._get_cookies()
+        deadline = self._deadline()
+        self._ensure_cookies(deadline=deadline)
         if not self._cookies:
             return
-        r = reqtry.post(url, cookies=self._cookies, data=data, allow_redirects=False, timeout=(3, 3), tries=3, delay=1,
-                        backoff=1.5, jitter=(1, 1.5))
+        for attempt in range(2):
+            cookies = self._cookies
+            r = self._request('POST', url, deadline=deadline, cookies=cookies, data=data)
+            self.stats['requests'] += 1
+            # Raw responses are redirects by design (ex. password change), so they can't signal an expired session.
+            if raw_res or attempt or not self._session_expired(r):
+                break
+            logger.debug("Session expired, logging in again.")
+            self._ensure_cookies(cookies, deadline)
+        self._invalidate_for(url)
         if raw_res:
             return r
         assert r.status_code == 200, f"Post request: Invalid http status code: {r.status_code}"
@@ -113,16 +324,40 @@ class TendaAC15():
         Returns:
             str: Request response '{"errCode":0}'
         """
-        return self._req_post(self._URLS['SetParentControl'], data={"deviceId": mac, "enable": status, "time": time, "url_enable": 1 if urls_blocked else 0, "urls": urls_blocked, "day": days, "limit_type": 0})
+        return self._req_post(self._URLS['SetParentControl'], data=forms.parent_control_data(mac, status, time, days, urls_blocked))
 
-    def get_vports(self) -> dict:
+    def set_parent_control_many(self, macs: list, status: int, time: str = "06:00-06:05", days: str = "1,1,1,1,1,1,1", urls_blocked: str = "") -> dict:
+        """
+        Set the same Parent Control configuration to many clients over a single session.
+        The firmware takes one client per request, so a failing client doesn't stop the others.
+        Args:
+            macs:list: Clients MAC addresses ex: ["aa:bb:cc:dd:ee:ff", ...]
+            status:int: Status of client Parent Control ex: 1 (enable) 0 (disable)
+            time:str: Time between is allowed. ex: "06:00-06:05"
+            days:str: Week days between is allowed. ex: "1,1,1,1,1,1,1"
+            urls_blocked:str: List of blocked urls. ex: "xvideos,pornhub"
+        Returns:
+            dict: {'aa:bb:cc:dd:ee:ff': '{"errCode":0}', ...} with the exception as value for failed clients.
+        """
+        results = {}
+        for mac in macs:
+            try:
+                results[mac] = self.set_parent_control(mac, status, time, days, urls_blocked)
+            except Exception as e:
+                logger.warning('Parent control of %s failed: %r', mac, e)
+                results[mac] = e
+        return results
+
+    def get_vports(self, refresh: bool = False) -> dict:
         """
         Return a dictionary of Virtual Server configuration.
+        Args:
+            refresh:bool: Skip the cache and fetch from the router.
         Returns:
             dict: {'lanIp': '192.168.1.1', 'lanMask': '255.255.255.0',
                    'virtualList': [{'ip': '192.168.1.100', 'inPort': '80', 'outPort': '80', 'protocol': '0'}, ...]}
         """
-        return self._get_json(self._URLS['GetVports'])
+        return self._get_cached('GetVports', refresh)
 
     def set_vports(self, vports_dict: dict) -> str:
         """
@@ -134,22 +369,33 @@ class TendaAC15():
         """
         if not vports_dict:
             return
-        vports_list = []
-        for host in vports_dict["virtualList"]:
-            vports_list.append(host["ip"] + "," + host["inPort"] +
-                               "," + host["outPort"] + "," + host["protocol"])
-        return self._req_post(self._URLS['SetVports'], data={
-            'list': '~'.join(vports_list)})
+        return self._req_post(self._URLS['SetVports'], data=forms.vports_data(vports_dict))
+
+    def apply_vports(self, vports_dict: dict, refresh: bool = False) -> ConfigDiff:
+        """
+        Set Virtual Server configuration only if it differs from the router's current one.
+        Args:
+            vports_dict:dict: Dictionary like the one returned by get_vports() method.
+            refresh:bool: Skip the cache when reading the current configuration.
+        Returns:
+            ConfigDiff: (added, removed, modified) entries. Nothing is written if diff.changed is False.
+        """
+        diff = diff_vports(self.get_vports(refresh), vports_dict)
+        if diff.changed:
+            self.set_vports(vports_dict)
+        return diff
 
-    def get_net_control(self) -> list:
+    def get_net_control(self, refresh: bool = False) -> list:
         """
         Return a list of Bandwidth configuration.
+        Args:
+            refresh:bool: Skip the cache and fetch from the router.
         Returns:
             list: [{'netControlEn': '1'}, {'upSpeed': '0', 'downSpeed': '0', 'devType': 'unknown',
                     'hostName': 'ClientName', 'ip': '192.168.1.100', 'mac': 'aa:bb:cc:dd:ee:ff', 'limitUp': '0',
                     'limitDown': '0', 'isControled': '0', 'offline': '0', 'isSet': '0'}, ...]
         """
-        return self._get_json(self._URLS['GetNetControl'])
+        return self._get_cached('GetNetControl', refresh)
 
     def set_net_control(self, net_control: list) -> str:
         """
@@ -161,20 +407,56 @@ class TendaAC15():
         """
         if not net_control:
             return
-        net_control_list = ""
-        for host in net_control[1:]:
-            net_control_list += host["hostName"] + "\r" + host["mac"] + \
-                "\r" + host["limitUp"] + "\r" + host["limitDown"] + "\n"
-        return self._req_post(self._URLS['SetNetControl'], data={"list": net_control_list})
+        return self._req_post(self._URLS['SetNetControl'], data=forms.net_control_data(net_control))
+
+    def apply_net_control(self, net_control: list, refresh: bool = False) -> ConfigDiff:
+        """
+        Set Bandwidth Control configuration only if it differs from the router's current one.
+        Args:
+            net_control:list: List like the one returned by get_net_control() method.
+            refresh:bool: Skip the cache when reading the current configuration.
+        Returns:
+            ConfigDiff: (added, removed, modified) entries. Nothing is written if diff.changed is False.
+        """
+        diff = diff_net_control(self.get_net_control(refresh), net_control)
+        if diff.changed:
+            self.set_net_control(net_control)
+        return diff
+
+    def set_bandwidth_limits(self, limits: dict, refresh: bool = False) -> ConfigDiff:
+        """
+        Set the bandwidth limits of many clients with a single read and at most one write.
+        Clients not yet in the Bandwidth Control list are added with their MAC address as name.
+        Args:
+            limits:dict: {mac: (limit_up, limit_down), ...} ex: {'aa:bb:cc:dd:ee:ff': (128, 1024)}
+            refresh:bool: Skip the cache when reading the current configuration.
+        Returns:
+            ConfigDiff: (added, removed, modified) entries. Nothing is written if diff.changed is False.
+        """
+        current = self.get_net_control(refresh)
+        desired = current[:1] + [dict(row) for row in current[1:]]
+        pending = {mac.lower(): (str(up), str(down)) for mac, (up, down) in limits.items()}
+        for row in desired[1:]:
+            limit = pending.pop(row["mac"].lower(), None)
+            if limit:
+                row["limitUp"], row["limitDown"] = limit
+        for mac, (up, down) in pending.items():
+            desired.append({"hostName": mac, "mac": mac, "limitUp": up, "limitDown": down})
+        diff = diff_net_control(current, desired)
+        if diff.changed:
+            self.set_net_control(desired)
+        return diff
 
-    def get_ipmac_bind(self) -> dict:
+    def get_ipmac_bind(self, refresh: bool = False) -> dict:
         """
         Return a dictionary of DHCP Reservation configuration.
+        Args:
+            refresh:bool: Skip the cache and fetch from the router.
         Returns:
             dict: {'lanIp': '192.168.1.1', 'lanMask': '255.255.255.0', 'dhttpIP': '172.27.175.218', 'dhcpClientList': [], 
                    'bindList': [{'ipaddr': '192.168.1.100', 'macaddr': 'aa:bb:cc:dd:ee:ff', 'devname': 'ClientName', 'status': '1'}, ...]}
         """
-        return self._get_json(self._URLS['GetIpMacBind'])
+        return self._get_cached('GetIpMacBind', refresh)
 
     def set_ipmac_bind(self, ipmac_bind_dict: dict) -> str:
         """
@@ -186,11 +468,21 @@ class TendaAC15():
         """
         if not ipmac_bind_dict:
             return
-        ipmac_bind = ""
-        for host in ipmac_bind_dict["bindList"]:
-            ipmac_bind += host["devname"] + "\r" + \
-                host["macaddr"] + "\r" + host["ipaddr"] + "\n"
-        return self._req_post(self._URLS['SetIpMacBind'], data={"bindnum": str(len(ipmac_bind_dict["bindList"])), "list": ipmac_bind})
+        return self._req_post(self._URLS['SetIpMacBind'], data=forms.ipmac_bind_data(ipmac_bind_dict))
+
+    def apply_ipmac_bind(self, ipmac_bind_dict: dict, refresh: bool = False) -> ConfigDiff:
+        """
+        Set DHCP Reservation configuration only if it differs from the router's current one.
+        Args:
+            ipmac_bind_dict:dict: Dictionary like the one returned by get_ipmac_bind() method.
+            refresh:bool: Skip the cache when reading the current configuration.
+        Returns:
+            ConfigDiff: (added, removed, modified) entries. Nothing is written if diff.changed is False.
+        """
+        diff = diff_ipmac_bind(self.get_ipmac_bind(refresh), ipmac_bind_dict)
+        if diff.changed:
+            self.set_ipmac_bind(ipmac_bind_dict)
+        return diff
 
     def filter_bindlist_by_devname(self, str_in_dev_name: str) -> list:
         """
@@ -198,22 +490,18 @@ class TendaAC15():
         Returns:
             list: [{'ipaddr': '192.168.1.100', 'macaddr': 'aa:bb:cc:dd:ee:ff', 'devname': 'ClientName', 'status': '1'}, ...]}
         """
-        mac_list = self.get_ipmac_bind()
+        return forms.filter_bindlist_by_devname(self.get_ipmac_bind(), str_in_dev_name)
 
-        def iterator_func(x):
-            if str_in_dev_name.lower() in x["devname"].lower():
-                return True
-            return False
-        return list(filter(iterator_func, mac_list["bindList"]))
-
-    def get_online_list(self) -> list:
+    def get_online_list(self, refresh: bool = False) -> list:
         """
         Return a list of online clients.
+        Args:
+            refresh:bool: Skip the cache and fetch from the router.
         Returns:
             list: [{"deviceId": "aa:bb:cc:dd:ee:ff", "ip": "192.168.1.100", "devName": "ClientName", "line": "2", "uploadSpeed": "0",
                     "downloadSpeed": "0", "linkType": "unknown", "black": 0, "isGuestClient": "false" }, ...]}
         """
-        return self._get_json(self._URLS['GetOnlineList'])[1:]
+        return self._get_cached('GetOnlineList', refresh)[1:]
 
     def filter_onlinelist_by_devname(self, str_in_dev_name: str, case_sensitive=True) -> list:
         """
@@ -225,15 +513,7 @@ class TendaAC15():
             list: [{"deviceId": "aa:bb:cc:dd:ee:ff", "ip": "192.168.1.100", "devName": "ClientName", "line": "2", "uploadSpeed": "0",
                     "downloadSpeed": "0", "linkType": "unknown", "black": 0, "isGuestClient": "false" }, ...]}
         """
-        online_list = self.get_online_list()
-
-        def iterator_func(x):
-            if case_sensitive and (str_in_dev_name in x["devName"]):
-                return True
-            if not case_sensitive and (str_in_dev_name.lower() in x["devName"].lower()):
-                return True
-            return False
-        return list(filter(iterator_func, online_list))
+        return forms.filter_onlinelist_by_devname(self.get_online_list(), str_in_dev_name, case_sensitive)
 
     def filter_onlinelist_by_iprange(self, ip_from: int, ip_to: int) -> list:
         """
@@ -245,24 +525,67 @@ class TendaAC15():
             list: [{"deviceId": "aa:bb:cc:dd:ee:ff", "ip": "192.168.1.100", "devName": "ClientName", "line": "2", "uploadSpeed": "0",
                     "downloadSpeed": "0", "linkType": "unknown", "black": 0, "isGuestClient": "false" }, ...]}
         """
-        ip_from, ip_to = int(ip_from), int(ip_to)
-        assert ip_from < ip_to, 'Invalid: ip_from must be lower than ip_to. Ex. "ip_from:100, ip_to:150"'
-        online_list = self.get_online_list()
+        return forms.filter_onlinelist_by_iprange(self.get_online_list(), ip_from, ip_to)
+
+    def snapshot(self, refresh: bool = False) -> 'ClientSnapshot':
+        """
+        Return a ClientSnapshot joining online clients, DHCP reservations and bandwidth settings by MAC address,
+        indexed to answer many queries from a single fetch.
+        Args:
+            refresh:bool: Skip the cache and fetch from the router.
+        Returns:
+            ClientSnapshot: ex: snapshot.by_mac("aa:bb:cc:dd:ee:ff"), snapshot.by_iprange(100, 150)
+        """
+        from .snapshot import ClientSnapshot
+        return ClientSnapshot.from_router(self, refresh)
 
-        def iterator_func(online_list):
-            ip = re.match(
-                r"(\d{1,3}.\d{1,3}.\d{1,3}.)(\d{1,3})",  online_list["ip"])
-            return True if ip_from <= int(ip[2]) <= ip_to else False
-        return list(filter(iterator_func, online_list))
+    def probe(self, deadline: float = 2, login: bool = False) -> 'ProbeResult':
+        """
+        Check TCP connect, HTTP reachability and, if there is a session, its validity with the lightest requests,
+        within a deadline and without retries. Never raises: failures are in the result.
+        Args:
+            deadline:float: Max seconds of the whole probe.
+            login:bool: Whether to login when there is no session, instead of skipping the session check.
+        Returns:
+            ProbeResult: ex: ProbeResult(router='http://192.168.1.1', ok=True, tcp=0.002, http=0.011, session=0.015,
+                                         session_valid=True, error=None)
+        """
+        from .probe import probe
+        return probe(self, deadline, login)
+
+    def export_config(self, path: str = None) -> dict:
+        """
+        Return a versioned snapshot of Virtual Server, DHCP Reservation, Bandwidth Control and per client
+        Parent Control configuration, fetched in parallel over this session.
+        Args:
+            path:str: JSON file to write the snapshot to. ex: "router.json"
+        Returns:
+            dict: {'version': 1, 'router': 'http://192.168.1.1', 'vports': {...}, 'ipmac_bind': {...},
+                   'net_control': [...], 'parent_control': {'aa:bb:cc:dd:ee:ff': {...}, ...}, ...}
+        """
+        from .config import export_config
+        return export_config(self, path)
+
+    def import_config(self, config) -> dict:
+        """
+        Restore a snapshot returned by export_config() method, writing only the sections that differ.
+        Args:
+            config:dict|str: Snapshot, or path of its JSON file.
+        Returns:
+            dict: {'ipmac_bind': ConfigDiff, 'vports': ConfigDiff, 'net_control': ConfigDiff,
+                   'parent_control': {'aa:bb:cc:dd:ee:ff': '{"errCode":0}', ...}}
+        """
+        from .config import import_config
+        return import_config(self, config)
 
     def reboot(self):
         """
         Reboot the router
         """
-        self._get_cookies()
+        self._ensure_cookies()
         assert self._cookies, "Reboot failed. It couldn't get the cookies."
-        r = reqtry.post(self._URLS['SysToolReboot'], cookies=self._cookies, data={'action': 0}, allow_redirects=False, timeout=(3, 3), tries=3, delay=1,
-                        backoff=1.5, jitter=(1, 1.5))
+        r = self._req_post(self._URLS['SysToolReboot'], data={'action': 0}, raw_res=True)
+        self._cookies = None
         assert r.status_code == 302, f"Post request: Invalid http status code: {r.status_code}"
 
     def set_wps_status(self, status: int) -> str:
@@ -273,7 +596,7 @@ class TendaAC15():
         Returns:
             str: Request response '{"errCode":0}'
         """
-        return self._req_post(self._URLS['SetWPS'], data={'wpsEn': status})
+        return self._req_post(self._URLS['SetWPS'], data=forms.wps_data(status))
 
     def setup_wifi(self, ssid: str, password: str) -> str:
         """
@@ -284,7 +607,7 @@ class TendaAC15():
         Returns:
             str: Request response '{"errCode":0}'
         """
-        return self._req_post(self._URLS['SetupWIFI'], data={"wrlEn": 1, "wrlEn_5g": 1, "security": "wpawpa2psk", "security_5g": "wpawpa2psk", "ssid": ssid, "ssid_5g": ssid, "hideSsid": 0, "hideSsid_5g": 0, "wrlPwd": password, "wrlPwd_5g": password})
+        return self._req_post(self._URLS['SetupWIFI'], data=forms.wifi_data(ssid, password))
 
     def set_autoreboot_status(self, status: int) -> str:
         """
@@ -294,7 +617,7 @@ class TendaAC15():
         Returns:
             str: Request response '{"errCode":0}'
         """
-        return self._req_post(self._URLS['SetAutoreboot'], data={"autoRebootEn": status, "delayRebootEn": True, "rebootTime": "02: 00"})
+        return self._req_post(self._URLS['SetAutoreboot'], data=forms.autoreboot_data(status))
 
     def set_router_password(self, old_pass: str, new_pass: str) -> str:
         """
@@ -303,8 +626,7 @@ class TendaAC15():
             old_pass:str: Old password.
             new_pass:str: New password.
         """
-        r = self._req_post(self._URLS['SetSysPass'], data={"GO": "system_password.html", "SYSOPS": hashlib.md5(str.encode(old_pass)).hexdigest(
-        ), "SYSPS": hashlib.md5(str.encode(new_pass)).hexdigest(), "SYSPS2": hashlib.md5(str.encode(new_pass)).hexdigest()}, raw_res=True)
+        r = self._req_post(self._URLS['SetSysPass'], data=forms.router_password_data(old_pass, new_pass), raw_res=True)
         assert "login" in r.headers["Location"], "Incorrect Old Password"
 
     def set_fast_internet(self, mac: str) -> str:
@@ -315,12 +637,7 @@ class TendaAC15():
         Returns:
             str: Request response '{"errCode":0}'
         """
-        data = {
-            "netWanType": 0,
-            "cloneType": 0,
-            "mac": mac,
-        }
-        return self._req_post(self._URLS['SetFastInternet'], data=data)
+        return self._req_post(self._URLS['SetFastInternet'], data=forms.fast_internet_data(mac))
 
     def set_fast_router(self, ssid: str, wifi_pass: str, router_pass: str) -> str:
         """
@@ -332,19 +649,14 @@ class TendaAC15():
         Returns:
             str: Request response '{"errCode":0}'
         """
-        data = {
-            "ssid": ssid,
-            "wrlPassword": wifi_pass,
-            "power": "high",
-            "timeZone": "-03:00",
-            "loginPwd": hashlib.md5(str.encode(router_pass)).hexdigest()
-        }
-        return self._req_post(self._URLS['SetFastRouter'], data=data)
+        return self._req_post(self._URLS['SetFastRouter'], data=forms.fast_router_data(ssid, wifi_pass, router_pass))
 
-    def get_router_status(self) -> list:
+    def get_router_status(self, refresh: bool = False) -> list:
         """
         Return a dictionary with router information.
+        Args:
+            refresh:bool: Skip the cache and fetch from the router.
         Returns:
             list: {"wl5gEn":"1","wl5gName":"Lajudini","wl24gEn":"1","wl24gName":"Lajudini","lineup":"1|0|0|1","usbNum":"0","clientNum":19,"blackNum":0,"listNum":0,"deviceName":"AC15","lanIP":"192.168.1.1","lanMAC":"CC:2D:21:8F:E4:60","workMode":"router","apStatus":"1310007","wanInfo":[{"wanStatus":"1310007","wanIp":"192.168.0.100","wanUploadSpeed":"20.56","wanDownloadSpeed":"648.83"}],"onlineUpgradeInfo":{"newVersionExist":"0","newVersion":"","curVersion":"V15.03.05.20_multi"}}
         """
-        return self._get_json(self._URLS['GetRouterStatus'])
+        return self._get_cached('GetRouterStatus', refresh)
@@ -0,0 +1,279 @@
+"""
+Asyncio client for Tenda AC15 routers. Requires the optional 'aiohttp' dependency:
+
+    $ pip install tendawifi[async]
+"""
+import asyncio
+import json
+import logging
+import time
+import aiohttp
+from . import forms
+from .credentials import resolve_password, DEFAULT_PASSWORD_ENV
+from .retry import RetryPolicy, CircuitOpenError
+logger = logging.getLogger(__name__)
+
+
+class AsyncTendaAC15():
+    """
+    Asyncio counterpart of TendaAC15 with the same methods as coroutines.
+    Args:
+        url_base:str: Router url ex: "http://192.168.1.1"
+        password:str|callable|provider: Router password, resolved on first use like in TendaAC15.
+        limit:int: Max concurrent requests to this router.
+        global_limit:asyncio.Semaphore: Semaphore shared by many clients to cap the overall concurrency. Create it
+                                        inside the event loop that runs the clients.
+        session:aiohttp.ClientSession: Session to share between clients. If not set the client owns one.
+        retry:RetryPolicy: Retry, timeout and circuit breaker policy.
+    """
+
+    def __init__(self, url_base='http://192.168.1.1', password=None, limit: int = 2, global_limit: asyncio.Semaphore = None,
+                 session: aiohttp.ClientSession = None, retry: RetryPolicy = None, password_env: str = DEFAULT_PASSWORD_ENV):
+        self._password = password
+        self._password_env = password_env
+        self._credentials = None
+        self._URL_BASE = url_base
+        self._URLS = {name: self._URL_BASE + path for name, path in forms.PATHS.items()}
+        self._cookies = None
+        self.stats = {'logins': 0, 'requests': 0}
+        self._limit_size = limit
+        # Created in the running loop on first use, asyncio primitives bind to the loop of their creation on 3.7-3.9.
+        self._loop = None
+        self._limit = None
+        self._login_lock = None
+        self._global_limit = global_limit
+        self._session = session
+        self._own_session = session is None
+        self._retry = retry or RetryPolicy(timeouts={'login': (5, 5)})
+        self._breaker = self._retry.breaker()
+
+    def _bind_loop(self):
+        """
+        Create the concurrency limit and the login lock in the running event loop, again if it has changed.
+        """
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._limit = asyncio.Semaphore(self._limit_size)
+            self._login_lock = asyncio.Lock()
+
+    @property
+    def _auth_data(self) -> dict:
+        if self._credentials is None:
+            password = resolve_password(self._password, self._URL_BASE, self._password_env)
+            self._credentials = {'username': 'admin', 'password': forms.md5(password)}
+        return self._credentials
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def close(self):
+        """
+        Close the client session if it is owned by this client.
+        """
+        if self._own_session and self._session is not None:
+            await self._session.close()
+        self._session = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None:
+            self._session = aiohttp.ClientSession(cookie_jar=aiohttp.DummyCookieJar())
+            self._own_session = True
+        return self._session
+
+    @staticmethod
+    def _client_timeout(timeout) -> aiohttp.ClientTimeout:
+        if isinstance(timeout, tuple):
+            return aiohttp.ClientTimeout(sock_connect=timeout[0], sock_read=timeout[1])
+        return aiohttp.ClientTimeout(total=timeout)
+
+    def _deadline(self) -> float:
+        return time.monotonic() + self._retry.deadline if self._retry.deadline else None
+
+    async def _request(self, method: str, url: str, deadline: float = None, **kwargs):
+        """
+        Send a request and read its body following the retry policy.
+        Connection errors and 5xx responses are retried with backoff, within the deadline of the whole call,
+        or the policy deadline from now if not given.
+        Returns:
+            tuple: (status, headers, cookies, text)
+        """
+        policy = self._retry
+        self._bind_loop()
+        if self._breaker is not None and not self._breaker.allow():
+            raise CircuitOpenError(f"Circuit open for {self._URL_BASE}, failing fast.")
+        endpoint = forms.endpoint(url)
+        if deadline is None:
+            deadline = self._deadline()
+        delay = policy.delay
+        attempt = 0
+        while True:
+            attempt += 1
+            timeout = self._client_timeout(policy.timeout_for(endpoint, deadline - time.monotonic() if deadline else None))
+            try:
+                async with self._limit:
+                    if self._global_limit is not None:
+                        await self._global_limit.acquire()
+                    try:
+                        async with self._get_session().request(method, url, allow_redirects=False,
+                                                               timeout=timeout, **kwargs) as r:
+                            text = await r.text()
+                            if r.status >= 500:
+                                r.raise_for_status()
+                            if self._breaker is not None:
+                                self._breaker.record_success()
+                            return r.status, r.headers, r.cookies, text
+                    finally:
+                        if self._global_limit is not None:
+                            self._global_limit.release()
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if attempt >= policy.tries or (deadline and time.monotonic() + delay >= deadline):
+                    if self._breaker is not None:
+                        self._breaker.record_failure()
+                    raise
+                logger.warning('%s, retrying in %s seconds...', e, delay)
+                await asyncio.sleep(delay)
+                delay = policy.next_delay(delay)
+
+    async def _get_cookies(self, deadline: float = None):
+        """
+        Get cookies to make requests.
+        """
+        status, _, cookies, _ = await self._request('POST', self._URLS['login'], deadline=deadline, data=self._auth_data)
+        self.stats['logins'] += 1
+        assert status == 302, f"Invalid http status code: {status}"
+        assert bool(cookies), "Cookies are empty."
+        self._cookies = {name: morsel.value for name, morsel in cookies.items()}
+
+    async def _ensure_cookies(self, stale=None, deadline: float = None):
+        """
+        Login if there is no session cookie yet, or if the session in use (stale) has expired.
+        Concurrent callers share a single login.
+        """
+        self._bind_loop()
+        async with self._login_lock:
+            if not self._cookies or self._cookies is stale:
+                await self._get_cookies(deadline)
+
+    @staticmethod
+    def _session_expired(status: int, text: str) -> bool:
+        return status in (301, 302, 401) or 'login.html' in text[:512].lower()
+
+    async def _send(self, method: str, url: str, data=None, raw_res: bool = False):
+        # One deadline for the whole call: login, session renewal and retries included.
+        deadline = self._deadline()
+        await self._ensure_cookies(deadline=deadline)
+        for attempt in range(2):
+            cookies = self._cookies
+            res = await self._request(method, url, deadline=deadline, cookies=cookies, data=data)
+            self.stats['requests'] += 1
+            if raw_res or attempt or not self._session_expired(res[0], res[3]):
+                break
+            logger.debug("Session expired, logging in again.")
+            await self._ensure_cookies(cookies, deadline)
+        return res
+
+    async def _get_json(self, url: str):
+        """
+        Return a dictionary from a JSON object of a GET request.
+        """
+        status, _, _, text = await self._send('GET', url)
+        assert status == 200, f"Get request: Invalid http status code: {status}"
+        return json.loads(text) if text else None
+
+    async def _req_post(self, url: str, data, raw_res: bool = False):
+        """
+        Return the POST request response in text format.
+        """
+        res = await self._send('POST', url, data=data, raw_res=raw_res)
+        if raw_res:
+            return res
+        status, _, _, text = res
+        assert status == 200, f"Post request: Invalid http status code: {status}"
+        assert '"errCode":0' in text, f'Post response with error from server. Response: {text}'
+        return text
+
+    async def get_parent_control(self, mac: str) -> dict:
+        return await self._get_json(self._URLS['GetParentControl'] + mac)
+
+    async def set_parent_control(self, mac: str, status: int, time: str = "06:00-06:05", days: str = "1,1,1,1,1,1,1", urls_blocked: str = "") -> str:
+        return await self._req_post(self._URLS['SetParentControl'], data=forms.parent_control_data(mac, status, time, days, urls_blocked))
+
+    async def get_vports(self) -> dict:
+        return await self._get_json(self._URLS['GetVports'])
+
+    async def set_vports(self, vports_dict: dict) -> str:
+        if not vports_dict:
+            return
+        return await self._req_post(self._URLS['SetVports'], data=forms.vports_data(vports_dict))
+
+    async def get_net_control(self) -> list:
+        return await self._get_json(self._URLS['GetNetControl'])
+
+    async def set_net_control(self, net_control: list) -> str:
+        if not net_control:
+            return
+        return await self._req_post(self._URLS['SetNetControl'], data=forms.net_control_data(net_control))
+
+    async def get_ipmac_bind(self) -> dict:
+        return await self._get_json(self._URLS['GetIpMacBind'])
+
+    async def set_ipmac_bind(self, ipmac_bind_dict: dict) -> str:
+        if not ipmac_bind_dict:
+            return
+        return await self._req_post(self._URLS['SetIpMacBind'], data=forms.ipmac_bind_data(ipmac_bind_dict))
+
+    async def filter_bindlist_by_devname(self, str_in_dev_name: str) -> list:
+        return forms.filter_bindlist_by_devname(await self.get_ipmac_bind(), str_in_dev_name)
+
+    async def get_online_list(self) -> list:
+        return (await self._get_json(self._URLS['GetOnlineList']))[1:]
+
+    async def filter_onlinelist_by_devname(self, str_in_dev_name: str, case_sensitive=True) -> list:
+        return forms.filter_onlinelist_by_devname(await self.get_online_list(), str_in_dev_name, case_sensitive)
+
+    async def filter_onlinelist_by_iprange(self, ip_from: int, ip_to: int) -> list:
+        return forms.filter_onlinelist_by_iprange(await self.get_online_list(), ip_from, ip_to)
+
+    async def reboot(self):
+        status, _, _, _ = await self._req_post(self._URLS['SysToolReboot'], data={'action': 0}, raw_res=True)
+        self._cookies = None
+        assert status == 302, f"Post request: Invalid http status code: {status}"
+
+    async def set_wps_status(self, status: int) -> str:
+        return await self._req_post(self._URLS['SetWPS'], data=forms.wps_data(status))
+
+    async def setup_wifi(self, ssid: str, password: str) -> str:
+        return await self._req_post(self._URLS['SetupWIFI'], data=forms.wifi_data(ssid, password))
+
+    async def set_autoreboot_status(self, status: int) -> str:
+        return await self._req_post(self._URLS['SetAutoreboot'], data=forms.autoreboot_data(status))
+
+    async def set_router_password(self, old_pass: str, new_pass: str):
+        _, headers, _, _ = await self._req_post(self._URLS['SetSysPass'], data=forms.router_password_data(old_pass, new_pass), raw_res=True)
+        assert "login" in headers.get("Location", ""), "Incorrect Old Password"
+
+    async def set_fast_internet(self, mac: str) -> str:
+        return await self._req_post(self._URLS['SetFastInternet'], data=forms.fast_internet_data(mac))
+
+    async def set_fast_router(self, ssid: str, wifi_pass: str, router_pass: str) -> str:
+        return await self._req_post(self._URLS['SetFastRouter'], data=forms.fast_router_data(ssid, wifi_pass, router_pass))
+
+    async def get_router_status(self) -> dict:
+        return await self._get_json(self._URLS['GetRouterStatus'])
+
+
+async def gather_fleet(clients: list, method: str, *args, **kwargs) -> list:
+    """
+    Run a method on many AsyncTendaAC15 clients concurrently.
+    Args:
+        clients:list: List of AsyncTendaAC15 objects.
+        method:str: Method name ex: "get_online_list"
+    Returns:
+        list: Results in the same order as clients. Failed calls return their exception.
+    """
+    return await asyncio.gather(*(getattr(client, method)(*args, **kwargs) for client in clients),
+                                return_exceptions=True)
@@ -0,0 +1,191 @@
+"""
+Columnar NumPy tables of the online clients and status of many routers, with vectorized aggregations.
+Requires the optional 'numpy' dependency:
+
+    $ pip install tendawifi[analytics]
+"""
+import numpy as np
+from .maintenance import wan_up
+
+AGGREGATIONS = ('sum', 'mean', 'count', 'min', 'max')
+
+
+def _floats(values: list) -> np.ndarray:
+    # NumPy parses the numeric strings of the router in C.
+    return np.array([v or '0' for v in values], dtype=np.str_).astype(np.float64) if values else np.zeros(0)
+
+
+def _truthy(values: list) -> np.ndarray:
+    return np.array([str(v).lower() in ('1', 'true') for v in values], dtype=bool)
+
+
+class ClientTable():
+    """
+    Online clients of many routers as NumPy columns: router, mac, ip, name, line (band), upload, download,
+    guest, blocked, limit_up and limit_down. router is an index of the routers list.
+        >>> table = ClientTable.from_fleet(fleet)
+        >>> table.group_by(('router', 'line'), 'download', 'sum')
+        >>> table.percentile('download', [50, 95]), table.top('download', 10)
+    Args:
+        routers:list: Router names ex: ['http://192.168.1.1', ...]
+        columns:dict: {'router': np.ndarray, 'mac': np.ndarray, ...} of the same length.
+    """
+
+    def __init__(self, routers: list, columns: dict):
+        self.routers = list(routers)
+        self.columns = columns
+
+    def __len__(self):
+        return len(self.columns['router'])
+
+    def __getitem__(self, column: str) -> np.ndarray:
+        return self.columns[column]
+
+    @classmethod
+    def from_online_lists(cls, online_lists: dict, net_controls: dict = None) -> 'ClientTable':
+        """
+        Return a table from {router: get_online_list()} and optionally {router: get_net_control()} for the limits.
+        """
+        routers = list(online_lists)
+        clients = [c for lst in online_lists.values() for c in lst]
+        limits = {}
+        for router, net_control in (net_controls or {}).items():
+            for row in net_control[1:]:
+                limits[(router, row["mac"].lower())] = (row.get("limitUp") or '0', row.get("limitDown") or '0')
+        keys = [(router, c["deviceId"].lower()) for router, lst in online_lists.items() for c in lst]
+        joined = [limits.get(key, ('0', '0')) for key in keys]
+        columns = {
+            'router': np.repeat(np.arange(len(routers), dtype=np.int32), [len(lst) for lst in online_lists.values()]),
+            'mac': np.array([mac for _, mac in keys], dtype=np.str_),
+            'ip': np.array([c.get("ip", "") for c in clients], dtype=np.str_),
+            'name': np.array([c.get("devName", "") for c in clients], dtype=object),
+            'line': _floats([c.get("line") for c in clients]).astype(np.int8),
+            'upload': _floats([c.get("uploadSpeed") for c in clients]),
+            'download': _floats([c.get("downloadSpeed") for c in clients]),
+            'guest': _truthy([c.get("isGuestClient") for c in clients]),
+            'blocked': _truthy([c.get("black") for c in clients]),
+            'limit_up': _floats([up for up, _ in joined]),
+            'limit_down': _floats([down for _, down in joined]),
+        }
+        return cls(routers, columns)
+
+    @classmethod
+    def from_fleet(cls, fleet, limits: bool = False) -> 'ClientTable':
+        """
+        Return a table of the online clients of every router of a TendaFleet, fetched in parallel.
+        Failed routers are left out.
+        Args:
+            fleet:TendaFleet: Routers to fetch.
+            limits:bool: Whether to also fetch the Bandwidth Control limits.
+        """
+        def fetch(client):
+            return client.get_online_list(), client.get_net_control() if limits else None
+        results = {r.router: r.result for r in fleet.run(fetch).values() if r.error is None}
+        return cls.from_online_lists({router: result[0] for router, result in results.items()},
+                                     {router: result[1] for router, result in results.items()} if limits else None)
+
+    def where(self, mask: np.ndarray) -> 'ClientTable':
+        """
+        Return the rows of a boolean mask ex: table.where(table['guest'])
+        """
+        return ClientTable(self.routers, {name: column[mask] for name, column in self.columns.items()})
+
+    def _keys(self, by) -> tuple:
+        """
+        Return (unique key tuples, inverse index of every row) of one or many columns.
+        """
+        by = (by,) if isinstance(by, str) else tuple(by)
+        if not len(self):
+            return [], np.zeros(0, dtype=np.intp)
+        codes, uniques = [], []
+        for column in by:
+            unique, inverse = np.unique(self.columns[column], return_inverse=True)
+            labels = unique.tolist()
+            if column == 'router':
+                labels = [self.routers[i] for i in labels]
+            uniques.append(labels)
+            codes.append(inverse.reshape(-1))
+        shape = tuple(len(u) for u in uniques)
+        flat = np.ravel_multi_index(codes, shape)
+        groups, inverse = np.unique(flat, return_inverse=True)
+        keys = [tuple(u[i] for u, i in zip(uniques, idx)) for idx in zip(*np.unravel_index(groups, shape))]
+        return [k[0] if len(by) == 1 else k for k in keys], inverse.reshape(-1)
+
+    def group_by(self, by='router', value: str = 'download', agg: str = 'sum') -> dict:
+        """
+        Aggregate a column per group of one or many columns.
+        Args:
+            by:str|tuple: Column or columns ex: 'router', ('router', 'line'), 'guest'
+            value:str: Numeric column to aggregate ex: 'download'
+            agg:str: 'sum', 'mean', 'count', 'min' or 'max'
+        Returns:
+            dict: {'http://192.168.1.1': 1234.5, ...} or {('http://192.168.1.1', 2): 1234.5, ...}
+        """
+        assert agg in AGGREGATIONS, f"agg must be one of {AGGREGATIONS}"
+        keys, inverse = self._keys(by)
+        count = np.bincount(inverse, minlength=len(keys))
+        values = self.columns[value].astype(np.float64) if agg != 'count' else None
+        if agg == 'count':
+            result = count
+        elif agg in ('sum', 'mean'):
+            result = np.bincount(inverse, weights=values, minlength=len(keys))
+            if agg == 'mean':
+                result = result / np.maximum(count, 1)
+        else:
+            result = np.full(len(keys), np.inf if agg == 'min' else -np.inf)
+            (np.minimum if agg == 'min' else np.maximum).at(result, inverse, values)
+        return dict(zip(keys, result.tolist()))
+
+    def percentile(self, value: str, q, by=None):
+        """
+        Return percentiles of a column, overall or per group.
+        Args:
+            value:str: Numeric column ex: 'download'
+            q:float|list: Percentiles between 0 and 100 ex: [50, 95, 99]
+            by:str|tuple: Columns to group by. Overall if not set.
+        Returns:
+            float|list|dict: ex: [120.5, 980.0] or {'http://192.168.1.1': [120.5, 980.0], ...}
+        """
+        values = self.columns[value].astype(np.float64)
+        if by is None:
+            return np.percentile(values, q).tolist() if values.size else None
+        keys, inverse = self._keys(by)
+        # Sorting by group then value puts every group in a contiguous slice.
+        order = np.lexsort((values, inverse))
+        bounds = np.searchsorted(inverse[order], np.arange(len(keys) + 1))
+        return {key: np.percentile(values[order[bounds[i]:bounds[i + 1]]], q).tolist() for i, key in enumerate(keys)}
+
+    def top(self, value: str = 'download', n: int = 10) -> list:
+        """
+        Return the n rows with the largest value.
+        Returns:
+            list: [{'router': 'http://192.168.1.1', 'mac': 'aa:bb:cc:dd:ee:ff', 'name': 'laptop', 'download': 980.0, ...}, ...]
+        """
+        values = self.columns[value]
+        n = min(n, len(values))
+        if not n:
+            return []
+        idx = np.argpartition(-values, n - 1)[:n]
+        idx = idx[np.argsort(-values[idx], kind='stable')]
+        rows = []
+        for i in idx.tolist():
+            row = {name: column[i].item() if hasattr(column[i], 'item') else column[i] for name, column in self.columns.items()}
+            row['router'] = self.routers[row['router']]
+            rows.append(row)
+        return rows
+
+
+def status_table(statuses: dict) -> dict:
+    """
+    Return NumPy columns of {router: get_router_status()}: router (name), clients, wan_up, upload and download
+    (summed over every WAN).
+    """
+    routers = list(statuses)
+    wans = [s.get("wanInfo") or [] for s in statuses.values()]
+    return {
+        'router': np.array(routers, dtype=object),
+        'clients': _floats([s.get("clientNum") for s in statuses.values()]).astype(np.int64),
+        'wan_up': np.array([wan_up(s) for s in statuses.values()], dtype=bool),
+        'upload': np.array([_floats([w.get("wanUploadSpeed") for w in ws]).sum() for ws in wans], dtype=np.float64),
+        'download': np.array([_floats([w.get("wanDownloadSpeed") for w in ws]).sum() for ws in wans], dtype=np.float64),
+    }
@@ -0,0 +1,67 @@
+"""
+Small thread-safe TTL cache used by TendaAC15 to avoid downloading the same table again and again.
+"""
+import copy
+import threading
+import time
+
+
+class TTLCache():
+    """
+    Cache of endpoint responses with a time to live per endpoint.
+    Args:
+        ttl:float|dict: Seconds to keep every entry, or a dictionary of seconds per key.
+                        ex: 5 or {'GetOnlineList': 2, 'GetVports': 60}
+    """
+
+    def __init__(self, ttl, clock=time.monotonic):
+        self._ttl = ttl
+        self._clock = clock
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def ttl(self, key: str) -> float:
+        """
+        Return the time to live of a key. 0 means the key isn't cached.
+        """
+        if isinstance(self._ttl, dict):
+            return self._ttl.get(key, 0)
+        return self._ttl or 0
+
+    def get(self, key: str):
+        """
+        Return a tuple (hit, value). The value is a copy, so callers can edit it freely.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= self._clock():
+                self.misses += 1
+                return False, None
+            self.hits += 1
+            return True, copy.deepcopy(entry[1])
+
+    def set(self, key: str, value):
+        ttl = self.ttl(key)
+        if not ttl:
+            return
+        with self._lock:
+            self._entries[key] = (self._clock() + ttl, copy.deepcopy(value))
+
+    def invalidate(self, *keys):
+        """
+        Drop the given keys, or every key if none is given.
+        """
+        with self._lock:
+            if not keys:
+                self._entries.clear()
+            for key in keys:
+                self._entries.pop(key, None)
+
+    @property
+    def stats(self) -> dict:
+        with self._lock:
+            now = self._clock()
+            return {'hits': self.hits, 'misses': self.misses,
+                    'entries': sum(1 for expires, _ in self._entries.values() if expires > now)}
@@ -0,0 +1,150 @@
+"""
+Command line tool running router commands across a fleet inventory, streaming one JSON line per router.
+
+    $ tendawifi -i routers.json --select "site-a*" --parallel 16 status
+    $ tendawifi -i routers.json set-wps off
+    $ tendawifi -i routers.json call set_autoreboot_status 1
+
+The inventory is a JSON list of routers, or an object with a "routers" list:
+
+    [{"name": "office", "url": "http://192.168.1.1", "password_env": "OFFICE_PASS", "tags": ["site-a"]}, ...]
+
+Each router may set "password" or "password_env"; without them TENDA_PASSWORD is read.
+"""
+import argparse
+import json
+import logging
+import os
+import re
+import sys
+from fnmatch import fnmatch
+from . import TendaAC15
+from .credentials import DEFAULT_PASSWORD_ENV
+from .fleet import TendaFleet
+from .retry import RetryPolicy
+
+DEFAULT_INVENTORY = 'routers.json'
+
+
+def load_inventory(path: str) -> list:
+    """
+    Return the list of routers of an inventory file, each with a name.
+    """
+    with open(path) as f:
+        inventory = json.load(f)
+    routers = inventory.get('routers', []) if isinstance(inventory, dict) else inventory
+    for router in routers:
+        assert 'url' in router, f"Router without url in inventory: {router}"
+        router.setdefault('name', router['url'])
+    return routers
+
+
+def select(routers: list, patterns: list) -> list:
+    """
+    Return the routers whose name, url or a tag matches any of the glob patterns, or all of them if there are none.
+    """
+    if not patterns:
+        return routers
+    return [r for r in routers
+            if any(fnmatch(value, p) for p in patterns for value in [r['name'], r['url']] + list(r.get('tags', [])))]
+
+
+def _value(text: str):
+    try:
+        return json.loads(text)
+    except ValueError:
+        return text
+
+
+def _filename(name: str) -> str:
+    """
+    Return a router name as a file name that stays in its directory ex: "http://10.0.0.1" -> "http___10.0.0.1"
+    """
+    return re.sub(r'[^\w.-]', '_', name).lstrip('.') or '_'
+
+
+def _command(args) -> tuple:
+    """
+    Return (method, args) to run on every router for the parsed command line.
+    """
+    if args.command == 'status':
+        return 'get_router_status', ()
+    if args.command == 'online':
+        return 'get_online_list', ()
+    if args.command == 'reboot':
+        return 'reboot', ()
+    if args.command == 'set-wps':
+        return 'set_wps_status', (1 if args.state == 'on' else 0,)
+    if args.command == 'export':
+        files = {url: _filename(name) + '.json' for url, name in args.names.items()}
+        if len(set(files.values())) < len(files):
+            raise SystemExit("Router names map to the same export file name.")
+        os.makedirs(args.directory, exist_ok=True)
+
+        def export(client):
+            path = os.path.join(args.directory, files[client._URL_BASE])
+            client.export_config(path)
+            return path
+        return export, ()
+    if args.method.startswith('_') or not callable(getattr(TendaAC15, args.method, None)):
+        raise SystemExit(f"Unknown method: {args.method}")
+    return args.method, tuple(_value(a) for a in args.args)
+
+
+def parse_args(argv: list = None):
+    parser = argparse.ArgumentParser(prog='tendawifi', description='Run commands on a fleet of Tenda AC15 routers.')
+    parser.add_argument('-i', '--inventory', default=os.environ.get('TENDA_INVENTORY', DEFAULT_INVENTORY),
+                        help='JSON inventory of routers (default: $TENDA_INVENTORY or routers.json).')
+    parser.add_argument('-s', '--select', action='append', default=[],
+                        help='Glob of router names, urls or tags. Can be repeated.')
+    parser.add_argument('-p', '--parallel', type=int, default=8, help='Max routers handled at the same time.')
+    parser.add_argument('--timeout', type=float, default=3, help='Connect and read timeout in seconds.')
+    parser.add_argument('--tries', type=int, default=3, help='Max attempts of every request.')
+    parser.add_argument('-v', '--verbose', action='store_true')
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('status', help='Router status.')
+    commands.add_parser('online', help='Online clients.')
+    commands.add_parser('reboot', help='Reboot the routers.')
+    wps = commands.add_parser('set-wps', help='Enable or disable WPS.')
+    wps.add_argument('state', choices=['on', 'off'])
+    export = commands.add_parser('export', help='Export each router configuration to DIRECTORY/<name>.json. '
+                                    'Characters of the name other than letters, digits, ".", "-" and "_" become "_".')
+    export.add_argument('directory')
+    call = commands.add_parser('call', help='Call any TendaAC15 method. Arguments are parsed as JSON when possible.')
+    call.add_argument('method')
+    call.add_argument('args', nargs='*')
+    return parser.parse_args(argv)
+
+
+def main(argv: list = None, out=None) -> int:
+    """
+    Run the command line tool. Return 0 if every router succeeded, 1 if any failed.
+    """
+    args = parse_args(argv)
+    out = out or sys.stdout
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.ERROR)
+    routers = select(load_inventory(args.inventory), args.select)
+    if not routers:
+        print('No router matches the selection.', file=sys.stderr)
+        return 2
+    args.names = {r['url']: r['name'] for r in routers}
+    method, method_args = _command(args)
+    policy = RetryPolicy(tries=args.tries, timeout=(args.timeout, args.timeout))
+    clients = [TendaAC15(r['url'], r.get('password'), retry=policy,
+                         password_env=r.get('password_env', DEFAULT_PASSWORD_ENV)) for r in routers]
+    failed = 0
+    with TendaFleet(clients, max_workers=args.parallel) as fleet:
+        for result in fleet.iter_run(method, *method_args):
+            line = {'router': args.names[result.router], 'url': result.router, 'ok': result.error is None}
+            if result.error is None:
+                line['result'] = result.result
+            else:
+                failed += 1
+                line['error'] = repr(result.error)
+            out.write(json.dumps(line, default=str) + '\n')
+            out.flush()
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
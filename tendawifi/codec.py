@@ -0,0 +1,62 @@
+"""
+Encoding of the goform list fields, tables of rows sent as one string with field and row separators.
+The router has no way to escape a separator, so values containing one are rejected instead of corrupting its table.
+"""
+
+# Characters that corrupt any list field of the router.
+RESERVED = '\r\n~'
+
+
+class ListFormat():
+    """
+    A goform list field ex: "name\\rmac\\rip\\n" rows of the IP-MAC Bind list.
+    Args:
+        fields:tuple: Keys of the row dictionaries, in the order of the router.
+        field_sep:str: Separator of the fields of a row.
+        row_sep:str: Separator of the rows.
+        terminated:bool: Whether every row, including the last one, ends with row_sep.
+    """
+
+    def __init__(self, fields: tuple, field_sep: str, row_sep: str, terminated: bool):
+        self.fields = tuple(fields)
+        self.field_sep = field_sep
+        self.row_sep = row_sep
+        self.terminated = terminated
+        self._reserved = ''.join(sorted(set(RESERVED + field_sep + row_sep) - {field_sep}))
+
+    def _row(self, row: dict) -> str:
+        values = [str(row[field]) for field in self.fields]
+        line = self.field_sep.join(values)
+        # One scan of the joined row instead of one per value; find the culprit only when it fails.
+        if line.count(self.field_sep) != len(values) - 1 or any(c in line for c in self._reserved):
+            for field, value in zip(self.fields, values):
+                bad = [c for c in value if c == self.field_sep or c in self._reserved]
+                if bad:
+                    raise ValueError(f"{field} {value!r} contains the reserved character {bad[0]!r}.")
+        return line
+
+    def encode(self, rows) -> str:
+        """
+        Return the list field of an iterable of row dictionaries. Raises ValueError if a value contains a separator.
+        """
+        text = self.row_sep.join([self._row(row) for row in rows])
+        return text + self.row_sep if self.terminated and text else text
+
+    def decode(self, text: str) -> list:
+        """
+        Return the list of row dictionaries of a list field. Raises ValueError on rows with a wrong number of fields.
+        """
+        rows = []
+        for line in text.split(self.row_sep):
+            if not line:
+                continue
+            values = line.split(self.field_sep)
+            if len(values) != len(self.fields):
+                raise ValueError(f"Expected {len(self.fields)} fields, got {len(values)}: {line!r}")
+            rows.append(dict(zip(self.fields, values)))
+        return rows
+
+
+NET_CONTROL = ListFormat(('hostName', 'mac', 'limitUp', 'limitDown'), '\r', '\n', terminated=True)
+IPMAC_BIND = ListFormat(('devname', 'macaddr', 'ipaddr'), '\r', '\n', terminated=True)
+VPORTS = ListFormat(('ip', 'inPort', 'outPort', 'protocol'), ',', '~', terminated=False)
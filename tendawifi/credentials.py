@@ -0,0 +1,32 @@
+"""
+Lazy resolution of router passwords.
+"""
+import os
+import sys
+from getpass import getpass
+
+DEFAULT_PASSWORD_ENV = 'TENDA_PASSWORD'
+KEYRING_SERVICE = 'tendawifi'
+
+
+def resolve_password(password, url_base: str, password_env: str = DEFAULT_PASSWORD_ENV) -> str:
+    """
+    Return the router password from the first source that has one:
+        1. password: A string, a callable returning it, or a keyring-style provider with a
+           get_password(service, username) method, asked for ('tendawifi', url_base). ex: the keyring module.
+        2. The password_env environment variable.
+        3. An interactive prompt, only when stdin is a terminal.
+    Raises:
+        ValueError: If no source has a password.
+    """
+    if hasattr(password, 'get_password'):
+        password = password.get_password(KEYRING_SERVICE, url_base)
+    elif callable(password):
+        password = password()
+    if not password and password_env:
+        password = os.environ.get(password_env)
+    if not password and sys.stdin is not None and sys.stdin.isatty():
+        password = getpass(f'Password for {url_base}: ')
+    if not password:
+        raise ValueError(f"No password for {url_base}. Pass one, or set the {password_env} environment variable.")
+    return password
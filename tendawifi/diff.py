@@ -0,0 +1,76 @@
+"""
+Compare router tables, to write them only when something changed.
+"""
+from collections import namedtuple
+
+
+class ConfigDiff(namedtuple('ConfigDiff', ['added', 'removed', 'modified'])):
+    """
+    Difference between two tables.
+        added:list: Entries only in the desired table.
+        removed:list: Entries only in the current table.
+        modified:list: Tuples (current, desired) of entries with the same key and different values.
+    """
+    __slots__ = ()
+
+    @property
+    def changed(self) -> bool:
+        return bool(self.added or self.removed or self.modified)
+
+
+def _numbered(rows: list, key):
+    """
+    Yield (key, row) pairs, numbering repeated keys so duplicated entries are compared one to one.
+    """
+    counts = {}
+    for row in rows:
+        k = key(row)
+        n = counts[k] = counts.get(k, -1) + 1
+        yield (k, n), row
+
+
+def diff_rows(current: list, desired: list, key, fields: tuple) -> ConfigDiff:
+    """
+    Return the ConfigDiff between two lists of dictionaries.
+    Args:
+        current:list: Entries on the router.
+        desired:list: Wanted entries.
+        key:callable: Function returning the identity of an entry.
+        fields:tuple: Keys compared to find modified entries. Only what the router stores is compared.
+    """
+    current_by_key = dict(_numbered(current, key))
+    added, modified = [], []
+    seen = set()
+    for k, row in _numbered(desired, key):
+        seen.add(k)
+        old = current_by_key.get(k)
+        if old is None:
+            added.append(row)
+        elif any(str(old.get(f)) != str(row.get(f)) for f in fields):
+            modified.append((old, row))
+    removed = [row for k, row in current_by_key.items() if k not in seen]
+    return ConfigDiff(added, removed, modified)
+
+
+def diff_net_control(current: list, desired: list) -> ConfigDiff:
+    """
+    Compare two lists returned by get_net_control() method.
+    """
+    return diff_rows((current or [])[1:], (desired or [])[1:], lambda row: row["mac"].lower(),
+                     ("hostName", "limitUp", "limitDown"))
+
+
+def diff_ipmac_bind(current: dict, desired: dict) -> ConfigDiff:
+    """
+    Compare two dictionaries returned by get_ipmac_bind() method.
+    """
+    return diff_rows((current or {}).get("bindList", []), (desired or {}).get("bindList", []),
+                     lambda row: row["macaddr"].lower(), ("devname", "ipaddr"))
+
+
+def diff_vports(current: dict, desired: dict) -> ConfigDiff:
+    """
+    Compare two dictionaries returned by get_vports() method. Rules are identified by their outside port and protocol.
+    """
+    return diff_rows((current or {}).get("virtualList", []), (desired or {}).get("virtualList", []),
+                     lambda row: (str(row["outPort"]), str(row["protocol"])), ("ip", "inPort"))
@@ -0,0 +1,105 @@
+"""
+Run TendaAC15 methods across many routers with a bounded thread pool.
+"""
+import logging
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from . import TendaAC15
+logger = logging.getLogger(__name__)
+
+FleetResult = namedtuple('FleetResult', ['router', 'result', 'error'])
+
+
+class TendaFleet():
+    """
+    Group of TendaAC15 clients, one per router, each with its own credentials and session.
+    Args:
+        routers:list: List of (url_base, password) pairs or TendaAC15 objects, with unique url bases.
+        max_workers:int: Max routers handled at the same time.
+        probe_workers:int: Max routers probed at the same time. Probes mostly wait, so it can be higher.
+        **client_kwargs: Extra arguments for every TendaAC15 created by the fleet. ex: timeout=(2, 2)
+    """
+
+    def __init__(self, routers: list, max_workers: int = 8, probe_workers: int = 32, **client_kwargs):
+        self.max_workers = max_workers
+        self.probe_workers = probe_workers
+        self.clients = {}
+        for router in routers:
+            client = router if isinstance(router, TendaAC15) else TendaAC15(*router, **client_kwargs)
+            # Clients and results are keyed by url base, so a second client of a router would replace the first.
+            if client._URL_BASE in self.clients:
+                raise ValueError(f"Duplicate router in fleet: {client._URL_BASE}")
+            self.clients[client._URL_BASE] = client
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return len(self.clients)
+
+    def close(self):
+        """
+        Close the sessions of every client.
+        """
+        for client in self.clients.values():
+            client.close()
+
+    @staticmethod
+    def _call(router: str, client: TendaAC15, method, args, kwargs) -> FleetResult:
+        try:
+            func = getattr(client, method) if isinstance(method, str) else lambda *a, **kw: method(client, *a, **kw)
+            return FleetResult(router, func(*args, **kwargs), None)
+        except Exception as e:
+            logger.warning('%s: %s failed: %r', router, method, e)
+            return FleetResult(router, None, e)
+
+    def iter_run(self, method, *args, routers: list = None, **kwargs):
+        """
+        Run a method on every router and yield each FleetResult as soon as its router finishes.
+        Args:
+            method:str|callable: Method name ex: "get_online_list", or a function taking the client as first argument.
+            routers:list: Url bases to run on. All routers if not set.
+        Returns:
+            generator: FleetResult(router, result, error)
+        """
+        selected = self.clients if routers is None else {r: self.clients[r] for r in routers}
+        if not selected:
+            return
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(selected))) as executor:
+            futures = [executor.submit(self._call, router, client, method, args, kwargs)
+                       for router, client in selected.items()]
+            for future in as_completed(futures):
+                yield future.result()
+
+    def run(self, method, *args, routers: list = None, **kwargs) -> dict:
+        """
+        Run a method on every router. A failing router doesn't stop the others.
+        Args:
+            method:str|callable: Method name ex: "get_online_list", or a function taking the client as first argument.
+            routers:list: Url bases to run on. All routers if not set.
+        Returns:
+            dict: {'http://192.168.1.1': FleetResult(router, result, error), ...} in fleet order.
+        """
+        results = {r.router: r for r in self.iter_run(method, *args, routers=routers, **kwargs)}
+        return {router: results[router] for router in self.clients if router in results}
+
+    def probe(self, deadline: float = 2, login: bool = False, routers: list = None) -> dict:
+        """
+        Probe up to probe_workers routers at the same time, so a fleet takes about one deadline per probe_workers
+        routers.
+        Args:
+            deadline:float: Max seconds of each probe.
+            login:bool: Whether to login to routers without a session.
+            routers:list: Url bases to probe. All routers if not set.
+        Returns:
+            dict: {'http://192.168.1.1': ProbeResult(router, ok, tcp, http, session, session_valid, error), ...}
+        """
+        selected = self.clients if routers is None else {r: self.clients[r] for r in routers}
+        if not selected:
+            return {}
+        with ThreadPoolExecutor(max_workers=min(self.probe_workers, len(selected))) as executor:
+            futures = {router: executor.submit(client.probe, deadline, login) for router, client in selected.items()}
+            return {router: future.result() for router, future in futures.items()}
@@ -0,0 +1,134 @@
+"""
+Router endpoints, goform payload builders and response filters shared by the sync and async clients.
+"""
+import hashlib
+import re
+from urllib.parse import urlsplit
+from . import codec
+
+PATHS = {
+    'login': '/login/Auth',
+    'GetParentControl': '/goform/GetParentControlInfo?mac=',
+    'SetParentControl': '/goform/saveParentControlInfo',
+    'GetVports': '/goform/GetVirtualServerCfg',
+    'SetVports': '/goform/SetVirtualServerCfg',
+    'GetNetControl': '/goform/GetNetControlList',
+    'SetNetControl': '/goform/SetNetControlList',
+    'GetIpMacBind': '/goform/GetIpMacBind',
+    'SetIpMacBind': '/goform/SetIpMacBind',
+    'GetOnlineList': '/goform/getOnlineList',
+    'SysToolReboot': '/goform/SysToolReboot',
+    'SetWPS': '/goform/WifiWpsSet',
+    'SetupWIFI': '/goform/WifiBasicSet',
+    'SetAutoreboot': '/goform/SetSysAutoRebbotCfg',
+    'SetSysPass': '/goform/SysToolChangePwd',
+    'SetFastInternet': '/goform/fast_setting_internet_set',
+    'SetFastRouter': '/goform/fast_setting_wifi_set',
+    'GetRouterStatus': '/goform/GetRouterStatus'
+}
+
+ENDPOINTS = {path.split('?')[0]: name for name, path in PATHS.items()}
+
+# Cached GET endpoints dropped after a successful write to each SET endpoint. None drops every entry.
+INVALIDATES = {
+    'SetVports': ('GetVports',),
+    'SetNetControl': ('GetNetControl',),
+    'SetIpMacBind': ('GetIpMacBind',),
+    'SetupWIFI': ('GetRouterStatus',),
+    'SysToolReboot': None,
+    'SetFastInternet': None,
+    'SetFastRouter': None,
+}
+
+
+def endpoint(url: str) -> str:
+    """
+    Return the endpoint name of a router url ex: "GetOnlineList", or its path if it's unknown.
+    """
+    path = urlsplit(url).path
+    return ENDPOINTS.get(path, path)
+
+
+def md5(text: str) -> str:
+    return hashlib.md5(str.encode(text)).hexdigest()
+
+
+def parent_control_data(mac: str, status: int, time: str, days: str, urls_blocked: str) -> dict:
+    return {"deviceId": mac, "enable": status, "time": time, "url_enable": 1 if urls_blocked else 0,
+            "urls": urls_blocked, "day": days, "limit_type": 0}
+
+
+def vports_data(vports_dict: dict) -> dict:
+    return {'list': codec.VPORTS.encode(vports_dict["virtualList"])}
+
+
+def net_control_data(net_control: list) -> dict:
+    return {"list": codec.NET_CONTROL.encode(net_control[1:])}
+
+
+def ipmac_bind_data(ipmac_bind_dict: dict) -> dict:
+    return {"bindnum": str(len(ipmac_bind_dict["bindList"])), "list": codec.IPMAC_BIND.encode(ipmac_bind_dict["bindList"])}
+
+
+def wps_data(status: int) -> dict:
+    return {'wpsEn': status}
+
+
+def wifi_data(ssid: str, password: str) -> dict:
+    return {"wrlEn": 1, "wrlEn_5g": 1, "security": "wpawpa2psk", "security_5g": "wpawpa2psk", "ssid": ssid,
+            "ssid_5g": ssid, "hideSsid": 0, "hideSsid_5g": 0, "wrlPwd": password, "wrlPwd_5g": password}
+
+
+def autoreboot_data(status: int) -> dict:
+    return {"autoRebootEn": status, "delayRebootEn": True, "rebootTime": "02: 00"}
+
+
+def router_password_data(old_pass: str, new_pass: str) -> dict:
+    return {"GO": "system_password.html", "SYSOPS": md5(old_pass), "SYSPS": md5(new_pass), "SYSPS2": md5(new_pass)}
+
+
+def fast_internet_data(mac: str) -> dict:
+    return {
+        "netWanType": 0,
+        "cloneType": 0,
+        "mac": mac,
+    }
+
+
+def fast_router_data(ssid: str, wifi_pass: str, router_pass: str) -> dict:
+    return {
+        "ssid": ssid,
+        "wrlPassword": wifi_pass,
+        "power": "high",
+        "timeZone": "-03:00",
+        "loginPwd": md5(router_pass)
+    }
+
+
+def filter_bindlist_by_devname(ipmac_bind_dict: dict, str_in_dev_name: str) -> list:
+    def iterator_func(x):
+        if str_in_dev_name.lower() in x["devname"].lower():
+            return True
+        return False
+    return list(filter(iterator_func, ipmac_bind_dict["bindList"]))
+
+
+def filter_onlinelist_by_devname(online_list: list, str_in_dev_name: str, case_sensitive=True) -> list:
+    def iterator_func(x):
+        if case_sensitive and (str_in_dev_name in x["devName"]):
+            return True
+        if not case_sensitive and (str_in_dev_name.lower() in x["devName"].lower()):
+            return True
+        return False
+    return list(filter(iterator_func, online_list))
+
+
+def filter_onlinelist_by_iprange(online_list: list, ip_from: int, ip_to: int) -> list:
+    ip_from, ip_to = int(ip_from), int(ip_to)
+    assert ip_from < ip_to, 'Invalid: ip_from must be lower than ip_to. Ex. "ip_from:100, ip_to:150"'
+
+    def iterator_func(online_list):
+        ip = re.match(
+            r"(\d{1,3}.\d{1,3}.\d{1,3}.)(\d{1,3})",  online_list["ip"])
+        return True if ip_from <= int(ip[2]) <= ip_to else False
+    return list(filter(iterator_func, online_list))
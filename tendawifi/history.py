@@ -0,0 +1,211 @@
+"""
+Append-only SQLite history of client and WAN throughput samples, with downsampling, retention and aggregate queries.
+"""
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+from .telemetry import ClientSample, WanSample
+
+# upload and download are volumes: speed times the seconds covered by the samples, ex: KB for speeds in KB/s.
+DeviceTotal = namedtuple('DeviceTotal', ['router', 'device_id', 'name', 'ip', 'upload', 'download', 'seconds'])
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS devices (
+    id INTEGER PRIMARY KEY, router TEXT NOT NULL, device_id TEXT NOT NULL, name TEXT, ip TEXT,
+    UNIQUE (router, device_id));
+CREATE TABLE IF NOT EXISTS client_samples (
+    time REAL NOT NULL, device INTEGER NOT NULL, upload REAL NOT NULL, download REAL NOT NULL, duration REAL NOT NULL);
+CREATE INDEX IF NOT EXISTS client_samples_time ON client_samples (time);
+CREATE TABLE IF NOT EXISTS wan_samples (
+    time REAL NOT NULL, router TEXT NOT NULL, upload REAL NOT NULL, download REAL NOT NULL, duration REAL NOT NULL);
+CREATE INDEX IF NOT EXISTS wan_samples_time ON wan_samples (router, time);
+"""
+
+
+class HistoryStore():
+    """
+    Throughput history kept in SQLite, so queries over millions of samples are aggregated by the database.
+    Samples are buffered and inserted in batches. Use add() as a Poller callback:
+        >>> store = HistoryStore("history.db", interval=5, retention=30 * 86400, downsampling=[(86400, 300)])
+        >>> Poller(t, interval=5, callback=store.add).start()
+        >>> store.top_talkers(since=time.time() - 3600)
+    Args:
+        path:str: SQLite database file. In memory if not set.
+        interval:float: Seconds covered by every sample, the poll interval.
+        batch_size:int: Buffered samples that trigger an insert.
+        retention:float: Seconds samples are kept by compact(). Forever if not set.
+        downsampling:list: (older_than, bucket) pairs in seconds. compact() merges samples older than older_than
+                           into one sample per bucket seconds. ex: [(86400, 300), (7 * 86400, 3600)]
+    """
+
+    def __init__(self, path: str = ':memory:', interval: float = 5, batch_size: int = 1000, retention: float = None,
+                 downsampling: list = None, clock=time.time):
+        self.interval = interval
+        self.batch_size = batch_size
+        self.retention = retention
+        self.downsampling = sorted(downsampling or [])
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._clients = []
+        self._wans = []
+        self._devices = {}
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        if path != ':memory:':
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.executescript(_SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """
+        Insert the buffered samples and close the database.
+        """
+        self.flush()
+        self._db.close()
+
+    def add(self, samples: list):
+        """
+        Buffer ClientSample and WanSample objects, inserting them once batch_size are buffered.
+        """
+        with self._lock:
+            for sample in samples:
+                if isinstance(sample, ClientSample):
+                    self._clients.append(sample)
+                elif isinstance(sample, WanSample):
+                    self._wans.append(sample)
+            if len(self._clients) + len(self._wans) >= self.batch_size:
+                self._flush()
+
+    def flush(self):
+        """
+        Insert the buffered samples in a single transaction.
+        """
+        with self._lock:
+            self._flush()
+
+    def _device(self, sample: ClientSample) -> int:
+        key = (sample.router, sample.device_id)
+        known = self._devices.get(key)
+        if known is None:
+            self._db.execute('INSERT OR IGNORE INTO devices (router, device_id) VALUES (?, ?)', key)
+            known = [self._db.execute('SELECT id FROM devices WHERE router = ? AND device_id = ?', key).fetchone()[0],
+                     None, None]
+            self._devices[key] = known
+        if (known[1], known[2]) != (sample.name, sample.ip):
+            self._db.execute('UPDATE devices SET name = ?, ip = ? WHERE id = ?', (sample.name, sample.ip, known[0]))
+            known[1], known[2] = sample.name, sample.ip
+        return known[0]
+
+    def _flush(self):
+        if not self._clients and not self._wans:
+            return
+        with self._db:
+            self._db.executemany('INSERT INTO client_samples VALUES (?, ?, ?, ?, ?)',
+                                 [(s.time, self._device(s), s.upload_speed, s.download_speed, self.interval)
+                                  for s in self._clients])
+            self._db.executemany('INSERT INTO wan_samples VALUES (?, ?, ?, ?, ?)',
+                                 [(s.time, s.router, s.upload_speed, s.download_speed, self.interval)
+                                  for s in self._wans])
+        self._clients, self._wans = [], []
+
+    def count(self) -> dict:
+        """
+        Return the number of stored samples ex: {'clients': 1200, 'wan': 60}
+        """
+        self.flush()
+        with self._lock:
+            return {'clients': self._db.execute('SELECT count(*) FROM client_samples').fetchone()[0],
+                    'wan': self._db.execute('SELECT count(*) FROM wan_samples').fetchone()[0]}
+
+    def compact(self, now: float = None) -> dict:
+        """
+        Apply the retention and downsampling policies.
+        Returns:
+            dict: Rows removed ex: {'expired': 100, 'downsampled': 5000}
+        """
+        self.flush()
+        now = self._clock() if now is None else now
+        removed = {'expired': 0, 'downsampled': 0}
+        with self._lock, self._db:
+            if self.retention is not None:
+                for table in ('client_samples', 'wan_samples'):
+                    removed['expired'] += self._db.execute(f'DELETE FROM {table} WHERE time < ?',
+                                                           (now - self.retention,)).rowcount
+            for older_than, bucket in self.downsampling:
+                # Only whole buckets are merged, so compacting again leaves merged samples untouched.
+                cutoff = (now - older_than) // bucket * bucket
+                for table, key in (('client_samples', 'device'), ('wan_samples', 'router')):
+                    before = self._db.execute(f'SELECT count(*) FROM {table} WHERE time < ?', (cutoff,)).fetchone()[0]
+                    self._db.execute(f'CREATE TEMP TABLE merged AS SELECT CAST(time / ? AS INTEGER) * ? AS time, {key}, '
+                                     f'sum(upload * duration) / sum(duration) AS upload, '
+                                     f'sum(download * duration) / sum(duration) AS download, sum(duration) AS duration '
+                                     f'FROM {table} WHERE time < ? GROUP BY 1, {key}', (bucket, bucket, cutoff))
+                    self._db.execute(f'DELETE FROM {table} WHERE time < ?', (cutoff,))
+                    after = self._db.execute(f'INSERT INTO {table} (time, {key}, upload, download, duration) '
+                                             f'SELECT time, {key}, upload, download, duration FROM merged').rowcount
+                    self._db.execute('DROP TABLE merged')
+                    removed['downsampled'] += before - after
+        return removed
+
+    def _totals(self, since: float, until: float, router: str, order: str = '', limit: int = None) -> list:
+        query = ('SELECT d.router, d.device_id, d.name, d.ip, sum(s.upload * s.duration) AS up, '
+                 'sum(s.download * s.duration) AS down, sum(s.duration) '
+                 'FROM client_samples s JOIN devices d ON d.id = s.device WHERE s.time >= ?')
+        params = [since]
+        if until is not None:
+            query += ' AND s.time < ?'
+            params.append(until)
+        if router is not None:
+            query += ' AND d.router = ?'
+            params.append(router)
+        query += ' GROUP BY s.device' + order
+        if limit is not None:
+            query += ' LIMIT ?'
+            params.append(limit)
+        self.flush()
+        with self._lock:
+            return [DeviceTotal(*row) for row in self._db.execute(query, params)]
+
+    def device_totals(self, since: float = 0, until: float = None, router: str = None) -> list:
+        """
+        Return the upload and download volume of every device in a time window.
+        Args:
+            since:float: Window start, unix time.
+            until:float: Window end, unix time. Now if not set.
+            router:str: Only devices of this router url.
+        Returns:
+            list: [DeviceTotal(router, device_id, name, ip, upload, download, seconds), ...]
+        """
+        return self._totals(since, until, router)
+
+    def top_talkers(self, since: float = 0, until: float = None, limit: int = 10, router: str = None) -> list:
+        """
+        Return the devices with the largest upload plus download volume in a time window.
+        Returns:
+            list: [DeviceTotal(router, device_id, name, ip, upload, download, seconds), ...] largest first.
+        """
+        return self._totals(since, until, router, ' ORDER BY up + down DESC', limit)
+
+    def wan_series(self, router: str, since: float = 0, until: float = None, bucket: float = None) -> list:
+        """
+        Return WAN speeds of a router, averaged per bucket seconds if set.
+        Returns:
+            list: [(time, upload_speed, download_speed), ...] oldest first.
+        """
+        where = 'router = ? AND time >= ?' + (' AND time < ?' if until is not None else '')
+        params = [router, since] + ([until] if until is not None else [])
+        if bucket:
+            query = ('SELECT CAST(time / ? AS INTEGER) * ?, sum(upload * duration) / sum(duration), '
+                     f'sum(download * duration) / sum(duration) FROM wan_samples WHERE {where} GROUP BY 1 ORDER BY 1')
+            params = [bucket, bucket] + params
+        else:
+            query = f'SELECT time, upload, download FROM wan_samples WHERE {where} ORDER BY time'
+        self.flush()
+        with self._lock:
+            return self._db.execute(query, params).fetchall()
@@ -0,0 +1,169 @@
+"""
+Rolling reboots of many routers, a few per site at a time, verifying each one is back online.
+"""
+import logging
+import time
+from collections import Counter, deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import requests
+from .retry import RetryPolicy
+logger = logging.getLogger(__name__)
+
+# downtime is the seconds from the reboot request to the first status with WAN up after the router was seen down,
+# None if it never came back.
+RebootResult = namedtuple('RebootResult', ['router', 'site', 'downtime', 'error'])
+
+
+def wan_up(status: dict) -> bool:
+    """
+    Return whether a get_router_status() response has a WAN with an IP address.
+    """
+    return any(w.get("wanIp") not in (None, "", "0.0.0.0") for w in (status or {}).get("wanInfo") or [])
+
+
+def _single_attempt(client):
+    """
+    Return a client of the same router, sharing its credentials, whose retry policy is set per status poll.
+    """
+    poller = type(client)(client._URL_BASE, client._password, password_env=client._password_env,
+                          retry=RetryPolicy(tries=1))
+    poller._auth_data = client._auth_data
+    return poller
+
+
+class RollingReboot():
+    """
+    Reboot routers with at most per_site of a site down at the same time. After each reboot the router status
+    is polled with exponential backoff until it has failed at least once, proving the router went down, and its
+    WAN is up again, before the next router of the site reboots. The reboot request and every poll are sent once,
+    bounded by the time left, whatever the retry policy of the client.
+    Routers still waiting when the time budget runs out are not rebooted.
+        >>> rolling = RollingReboot([("site-a", t1), ("site-a", t2), ("site-b", t3)], per_site=1, budget=1800)
+        >>> for result in rolling.iter_run():
+        ...     print(result.router, result.downtime, result.error)
+    Args:
+        routers:list: TendaAC15 objects, each its own site, or (site, TendaAC15) pairs.
+        per_site:int: Max routers of a site rebooting at the same time.
+        max_workers:int: Max routers rebooting at the same time.
+        budget:float: Seconds for the whole run.
+        router_timeout:float: Max seconds a router may take to come back.
+        initial_delay:float: Seconds before the first status poll, while the router goes down.
+        delay:float: Seconds between the first status polls.
+        backoff:float: Multiplier of the delay after every poll.
+        max_delay:float: Max seconds between polls.
+    """
+
+    def __init__(self, routers: list, per_site: int = 1, max_workers: int = 8, budget: float = 3600,
+                 router_timeout: float = 600, initial_delay: float = 5, delay: float = 1, backoff: float = 2,
+                 max_delay: float = 30, clock=time.monotonic, sleep=time.sleep):
+        self.routers = [r if isinstance(r, tuple) else (r._URL_BASE, r) for r in routers]
+        assert per_site >= 1 and max_workers >= 1, "per_site and max_workers must be at least 1."
+        self.per_site = per_site
+        self.max_workers = max_workers
+        self.budget = budget
+        self.router_timeout = router_timeout
+        self.initial_delay = initial_delay
+        self.delay = delay
+        self.backoff = backoff
+        self.max_delay = max_delay
+        self._clock = clock
+        self._sleep = sleep
+
+    def reboot_one(self, site: str, client, deadline: float = None) -> RebootResult:
+        """
+        Reboot a router, wait until it's seen down and then until its WAN is up again. A router that keeps
+        answering never rebooted, and times out.
+        Args:
+            site:str: Site of the router.
+            client:TendaAC15: Router client.
+            deadline:float: Clock time to give up waiting. router_timeout from now if not set.
+        Returns:
+            RebootResult: (router, site, downtime, error)
+        """
+        router = client._URL_BASE
+        start = self._clock()
+        deadline = min(deadline or float('inf'), start + self.router_timeout)
+        policy = client._retry
+        poller = _single_attempt(client)
+
+        def once():
+            # Retries would resend the reboot, or ride through a short one and delay the polls, so every request
+            # is sent once, within the time left.
+            poller._retry = RetryPolicy(tries=1, timeout=policy.timeout, timeouts=policy.timeouts,
+                                        deadline=max(deadline - self._clock(), 0.01))
+            return poller
+
+        try:
+            try:
+                once().reboot()
+            except requests.ConnectionError as e:
+                # The router may drop the connection as it goes down, so only the status polls tell.
+                logger.warning('%s: reboot request failed: %r', router, e)
+            except Exception as e:
+                logger.warning('%s: reboot failed: %r', router, e)
+                return RebootResult(router, site, None, e)
+            client._cookies = None
+            delay = self.delay
+            went_down = False
+            self._sleep(max(min(self.initial_delay, deadline - self._clock()), 0))
+            while True:
+                try:
+                    # Until the router is seen down, a status with WAN up comes from before the reboot took effect.
+                    if wan_up(once().get_router_status(refresh=True)) and went_down:
+                        downtime = self._clock() - start
+                        logger.info('%s: back online after %.1f seconds', router, downtime)
+                        return RebootResult(router, site, downtime, None)
+                except Exception as e:
+                    went_down = True
+                    logger.debug('%s: still down: %r', router, e)
+                if self._clock() + delay > deadline:
+                    if went_down:
+                        error = TimeoutError(f'{router} not back online after {self._clock() - start:.1f} seconds')
+                    else:
+                        error = TimeoutError(f'{router} never went down after {self._clock() - start:.1f} seconds')
+                    logger.warning('%s', error)
+                    return RebootResult(router, site, None, error)
+                self._sleep(delay)
+                delay = min(delay * self.backoff, self.max_delay)
+        finally:
+            poller.close()
+
+    def iter_run(self):
+        """
+        Reboot every router and yield each RebootResult as soon as its router is back or given up.
+        Returns:
+            generator: RebootResult(router, site, downtime, error)
+        """
+        deadline = self._clock() + self.budget
+        pending = deque(self.routers)
+        running = {}
+        down = Counter()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while pending or running:
+                if self._clock() < deadline:
+                    for _ in range(len(pending)):
+                        site, client = pending.popleft()
+                        if down[site] < self.per_site and len(running) < self.max_workers:
+                            down[site] += 1
+                            running[executor.submit(self.reboot_one, site, client, deadline)] = site
+                        else:
+                            pending.append((site, client))
+                else:
+                    while pending:
+                        site, client = pending.popleft()
+                        yield RebootResult(client._URL_BASE, site, None, TimeoutError('Time budget exhausted, not rebooted'))
+                if not running:
+                    continue
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    down[running.pop(future)] -= 1
+                    yield future.result()
+
+    def run(self) -> dict:
+        """
+        Reboot every router.
+        Returns:
+            dict: {'http://192.168.1.1': RebootResult(router, site, downtime, error), ...} in the given order.
+        """
+        results = {r.router: r for r in self.iter_run()}
+        return {client._URL_BASE: results[client._URL_BASE] for _, client in self.routers}
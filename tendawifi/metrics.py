@@ -0,0 +1,99 @@
+"""
+Request events fired by TendaAC15 and a latency collector with Prometheus text export.
+"""
+import threading
+from bisect import bisect_left
+from collections import namedtuple
+
+# kind: 'login', 'request_start', 'request_end', 'retry' or 'failure'.
+# duration is in seconds and None for 'request_start'. bytes is the response body length.
+RequestEvent = namedtuple('RequestEvent', ['kind', 'router', 'endpoint', 'method', 'duration', 'bytes',
+                                           'status', 'attempt', 'error'])
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+class _Histogram():
+    __slots__ = ('counts', 'sum', 'count')
+
+    def __init__(self, size: int):
+        self.counts = [0] * size
+        self.sum = 0.0
+        self.count = 0
+
+
+class LatencyCollector():
+    """
+    Observer keeping per router and endpoint latency histograms and counters of retries, failures, logins and bytes.
+        >>> collector = LatencyCollector()
+        >>> t = TendaAC15(url_base, password, observers=[collector])
+        >>> collector.to_prometheus()
+    Args:
+        buckets:tuple: Upper bounds in seconds of the histogram buckets.
+    """
+
+    def __init__(self, buckets: tuple = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.histograms = {}
+        self.counters = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, event: RequestEvent):
+        key = (event.router, event.endpoint)
+        with self._lock:
+            if event.kind == 'request_end':
+                histogram = self.histograms.get(key)
+                if histogram is None:
+                    histogram = self.histograms[key] = _Histogram(len(self.buckets))
+                i = bisect_left(self.buckets, event.duration)
+                if i < len(self.buckets):
+                    histogram.counts[i] += 1
+                histogram.sum += event.duration
+                histogram.count += 1
+                self._count('response_bytes', key, event.bytes)
+            elif event.kind in ('retry', 'failure', 'login'):
+                self._count(event.kind, key, 1)
+
+    def _count(self, name: str, key: tuple, value: int):
+        counter = self.counters.setdefault(name, {})
+        counter[key] = counter.get(key, 0) + value
+
+    def summary(self) -> dict:
+        """
+        Return {(router, endpoint): {'count': 10, 'mean': 0.012}, ...}
+        """
+        with self._lock:
+            return {key: {'count': h.count, 'mean': h.sum / h.count if h.count else 0.0}
+                    for key, h in self.histograms.items()}
+
+    def to_prometheus(self, prefix: str = 'tendawifi') -> str:
+        """
+        Return the metrics in Prometheus text exposition format.
+        """
+        def labels(key, **extra):
+            pairs = [('router', key[0]), ('endpoint', key[1])] + list(extra.items())
+            return '{' + ','.join('%s="%s"' % (k, str(v).replace('\\', '\\\\').replace('"', '\\"')) for k, v in pairs) + '}'
+
+        lines = []
+        name = f'{prefix}_request_duration_seconds'
+        with self._lock:
+            lines.append(f'# HELP {name} Latency of router requests.')
+            lines.append(f'# TYPE {name} histogram')
+            for key, h in sorted(self.histograms.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, h.counts):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{labels(key, le=bound)} {cumulative}')
+                lines.append(f'{name}_bucket{labels(key, le="+Inf")} {h.count}')
+                lines.append(f'{name}_sum{labels(key)} {h.sum}')
+                lines.append(f'{name}_count{labels(key)} {h.count}')
+            for counter, metric, help_text in (('response_bytes', 'response_bytes', 'Bytes received from routers.'),
+                                               ('login', 'logins', 'Logins to routers.'),
+                                               ('retry', 'retries', 'Retried router requests.'),
+                                               ('failure', 'failures', 'Router requests failed after every retry.')):
+                metric = f'{prefix}_{metric}_total'
+                lines.append(f'# HELP {metric} {help_text}')
+                lines.append(f'# TYPE {metric} counter')
+                for key, value in sorted(self.counters.get(counter, {}).items()):
+                    lines.append(f'{metric}{labels(key)} {value}')
+        return '\n'.join(lines) + '\n'
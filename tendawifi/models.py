@@ -0,0 +1,228 @@
+"""
+Typed records of router payloads, decoded once from the raw JSON dictionaries of the getters.
+Every model has from_dict() and, for writable tables, to_dict() returning the raw dictionary expected by set_* methods.
+"""
+from dataclasses import dataclass
+from ipaddress import IPv4Address
+
+
+class MacAddress(str):
+    """
+    MAC address normalized to lower case with colons ex: "aa:bb:cc:dd:ee:ff"
+    """
+    __slots__ = ()
+
+    def __new__(cls, value: str):
+        return super().__new__(cls, value.strip().lower().replace('-', ':'))
+
+
+def _bool(value) -> bool:
+    if isinstance(value, str):
+        return value.strip().lower() in ('1', 'true', 'yes', 'on')
+    return bool(value)
+
+
+def _int(value) -> int:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 0
+
+
+def _float(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _ip(value):
+    return IPv4Address(value) if value else None
+
+
+def _str(value) -> str:
+    return '' if value is None else str(value)
+
+
+def _speed(value: float) -> str:
+    return '%.2f' % value
+
+
+@dataclass
+class OnlineClient():
+    __slots__ = ('mac', 'ip', 'name', 'line', 'upload_speed', 'download_speed', 'link_type', 'blocked', 'guest')
+    mac: MacAddress
+    ip: IPv4Address
+    name: str
+    line: int
+    upload_speed: float
+    download_speed: float
+    link_type: str
+    blocked: bool
+    guest: bool
+
+    @classmethod
+    def from_dict(cls, d: dict) -> 'OnlineClient':
+        return cls(MacAddress(d["deviceId"]), _ip(d.get("ip")), d.get("devName", ""), _int(d.get("line")),
+                   _float(d.get("uploadSpeed")), _float(d.get("downloadSpeed")), d.get("linkType", ""),
+                   _bool(d.get("black")), _bool(d.get("isGuestClient")))
+
+    def to_dict(self) -> dict:
+        return {"deviceId": str(self.mac), "ip": _str(self.ip), "devName": self.name, "line": str(self.line),
+                "uploadSpeed": _speed(self.upload_speed), "downloadSpeed": _speed(self.download_speed),
+                "linkType": self.link_type, "black": int(self.blocked), "isGuestClient": "true" if self.guest else "false"}
+
+
+@dataclass
+class BindEntry():
+    __slots__ = ('mac', 'ip', 'name', 'enabled')
+    mac: MacAddress
+    ip: IPv4Address
+    name: str
+    enabled: bool
+
+    @classmethod
+    def from_dict(cls, d: dict) -> 'BindEntry':
+        return cls(MacAddress(d["macaddr"]), _ip(d.get("ipaddr")), d.get("devname", ""), _bool(d.get("status", "1")))
+
+    def to_dict(self) -> dict:
+        return {"ipaddr": _str(self.ip), "macaddr": str(self.mac), "devname": self.name, "status": "1" if self.enabled else "0"}
+
+
+@dataclass
+class NetControlRow():
+    __slots__ = ('mac', 'ip', 'name', 'limit_up', 'limit_down', 'up_speed', 'down_speed', 'dev_type',
+                 'controlled', 'offline', 'is_set')
+    mac: MacAddress
+    ip: IPv4Address
+    name: str
+    limit_up: int
+    limit_down: int
+    up_speed: float
+    down_speed: float
+    dev_type: str
+    controlled: bool
+    offline: bool
+    is_set: bool
+
+    @classmethod
+    def from_dict(cls, d: dict) -> 'NetControlRow':
+        return cls(MacAddress(d["mac"]), _ip(d.get("ip")), d.get("hostName", ""), _int(d.get("limitUp")),
+                   _int(d.get("limitDown")), _float(d.get("upSpeed")), _float(d.get("downSpeed")),
+                   d.get("devType", ""), _bool(d.get("isControled")), _bool(d.get("offline")), _bool(d.get("isSet")))
+
+    def to_dict(self) -> dict:
+        return {"upSpeed": _speed(self.up_speed), "downSpeed": _speed(self.down_speed), "devType": self.dev_type,
+                "hostName": self.name, "ip": _str(self.ip), "mac": str(self.mac), "limitUp": str(self.limit_up),
+                "limitDown": str(self.limit_down), "isControled": str(int(self.controlled)),
+                "offline": str(int(self.offline)), "isSet": str(int(self.is_set))}
+
+
+@dataclass
+class VirtualServer():
+    __slots__ = ('ip', 'in_port', 'out_port', 'protocol')
+    ip: IPv4Address
+    in_port: int
+    out_port: int
+    protocol: int
+
+    @classmethod
+    def from_dict(cls, d: dict) -> 'VirtualServer':
+        return cls(_ip(d.get("ip")), _int(d.get("inPort")), _int(d.get("outPort")), _int(d.get("protocol")))
+
+    def to_dict(self) -> dict:
+        return {"ip": _str(self.ip), "inPort": str(self.in_port), "outPort": str(self.out_port), "protocol": str(self.protocol)}
+
+
+@dataclass
+class WanInfo():
+    __slots__ = ('status', 'ip', 'upload_speed', 'download_speed')
+    status: str
+    ip: IPv4Address
+    upload_speed: float
+    download_speed: float
+
+    @classmethod
+    def from_dict(cls, d: dict) -> 'WanInfo':
+        return cls(d.get("wanStatus", ""), _ip(d.get("wanIp")), _float(d.get("wanUploadSpeed")),
+                   _float(d.get("wanDownloadSpeed")))
+
+
+@dataclass
+class RouterStatus():
+    __slots__ = ('device_name', 'lan_ip', 'lan_mac', 'work_mode', 'client_count', 'wifi_24g_enabled', 'wifi_24g_name',
+                 'wifi_5g_enabled', 'wifi_5g_name', 'firmware', 'wan')
+    device_name: str
+    lan_ip: IPv4Address
+    lan_mac: MacAddress
+    work_mode: str
+    client_count: int
+    wifi_24g_enabled: bool
+    wifi_24g_name: str
+    wifi_5g_enabled: bool
+    wifi_5g_name: str
+    firmware: str
+    wan: list
+
+    @classmethod
+    def from_dict(cls, d: dict) -> 'RouterStatus':
+        return cls(d.get("deviceName", ""), _ip(d.get("lanIP")), MacAddress(d.get("lanMAC", "")), d.get("workMode", ""),
+                   _int(d.get("clientNum")), _bool(d.get("wl24gEn")), d.get("wl24gName", ""), _bool(d.get("wl5gEn")),
+                   d.get("wl5gName", ""), (d.get("onlineUpgradeInfo") or {}).get("curVersion", ""),
+                   [WanInfo.from_dict(w) for w in d.get("wanInfo") or []])
+
+
+def parse_online_list(online_list: list) -> list:
+    """
+    Return a list of OnlineClient from the list returned by get_online_list() method.
+    """
+    return [OnlineClient.from_dict(d) for d in online_list]
+
+
+def parse_ipmac_bind(ipmac_bind_dict: dict) -> list:
+    """
+    Return a list of BindEntry from the dictionary returned by get_ipmac_bind() method.
+    """
+    return [BindEntry.from_dict(d) for d in ipmac_bind_dict.get("bindList", [])]
+
+
+def parse_net_control(net_control: list) -> list:
+    """
+    Return a list of NetControlRow from the list returned by get_net_control() method.
+    """
+    return [NetControlRow.from_dict(d) for d in net_control[1:]]
+
+
+def parse_vports(vports_dict: dict) -> list:
+    """
+    Return a list of VirtualServer from the dictionary returned by get_vports() method.
+    """
+    return [VirtualServer.from_dict(d) for d in vports_dict.get("virtualList", [])]
+
+
+def parse_router_status(status: dict) -> RouterStatus:
+    """
+    Return a RouterStatus from the dictionary returned by get_router_status() method.
+    """
+    return RouterStatus.from_dict(status)
+
+
+def ipmac_bind_payload(entries: list) -> dict:
+    """
+    Return the dictionary for set_ipmac_bind() method from a list of BindEntry.
+    """
+    return {"bindList": [entry.to_dict() for entry in entries]}
+
+
+def net_control_payload(rows: list, enabled: bool = True) -> list:
+    """
+    Return the list for set_net_control() method from a list of NetControlRow.
+    """
+    return [{"netControlEn": "1" if enabled else "0"}] + [row.to_dict() for row in rows]
+
+
+def vports_payload(rules: list) -> dict:
+    """
+    Return the dictionary for set_vports() method from a list of VirtualServer.
+    """
+    return {"virtualList": [rule.to_dict() for rule in rules]}
@@ -0,0 +1,263 @@
+"""
+Declarative bandwidth and parent control policies for groups of clients, applied by a long-lived scheduler.
+"""
+import logging
+import threading
+from collections import namedtuple
+from datetime import datetime, timedelta
+from .diff import diff_net_control
+logger = logging.getLogger(__name__)
+
+DAYS = ('mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun')
+# Order of the day flags of the firmware Parent Control 'day' field.
+ROUTER_DAYS = ('sun', 'mon', 'tue', 'wed', 'thu', 'fri', 'sat')
+
+LimitRule = namedtuple('LimitRule', ['group', 'up', 'down', 'window'])
+AccessRule = namedtuple('AccessRule', ['group', 'window', 'urls_blocked'])
+
+
+def _minutes(text: str) -> int:
+    hours, minutes = text.strip().split(':')
+    assert 0 <= int(hours) < 24 and 0 <= int(minutes) < 60, f"Invalid time: {text!r}"
+    return int(hours) * 60 + int(minutes)
+
+
+def _days(days) -> frozenset:
+    """
+    Return weekday numbers (0 is Monday) of ex: "mon-fri", "sat,sun", ["mon", "wed"], or every day if None.
+    """
+    if days is None:
+        return frozenset(range(7))
+    parts = days.split(',') if isinstance(days, str) else days
+    result = set()
+    for part in parts:
+        first, _, last = part.strip().lower().partition('-')
+        start, end = DAYS.index(first[:3]), DAYS.index((last or first)[:3])
+        result.update(DAYS.index(d) % 7 for d in (DAYS * 2)[start:start + (end - start) % 7 + 1])
+    return frozenset(result)
+
+
+class Window():
+    """
+    Weekly time window ex: Window("22:00-06:00", "sun-thu"). A window ending before it starts runs past
+    midnight, and belongs to the day it starts on.
+    Args:
+        time:str: Start and end ex: "08:00-17:30"
+        days:str|list: Days it starts on ex: "mon-fri", "sat,sun". Every day if not set.
+    """
+
+    def __init__(self, time: str, days=None):
+        start, end = time.split('-')
+        self.time = time
+        self.start, self.end = _minutes(start), _minutes(end)
+        self.days = _days(days)
+
+    def _spans(self, now: datetime):
+        midnight = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        for offset in range(-1, 9):
+            day = midnight + timedelta(days=offset)
+            if day.weekday() in self.days:
+                start = day + timedelta(minutes=self.start)
+                end = day + timedelta(minutes=self.end + (0 if self.end > self.start else 1440))
+                yield start, end
+
+    def contains(self, now: datetime) -> bool:
+        return any(start <= now < end for start, end in self._spans(now))
+
+    def next_transition(self, now: datetime) -> datetime:
+        """
+        Return the next time the window opens or closes after now.
+        """
+        return min((t for span in self._spans(now) for t in span if t > now), default=None)
+
+    def router_days(self) -> str:
+        """
+        Return the day flags of the Parent Control 'day' field ex: "0,1,1,1,1,1,0"
+        """
+        return ','.join('1' if DAYS.index(d) in self.days else '0' for d in ROUTER_DAYS)
+
+
+class Policy():
+    """
+    Groups of clients with bandwidth limits and allowed access times.
+        >>> policy = Policy.from_dict({
+        ...     "groups": {"kids": ["aa:bb:cc:dd:ee:ff"], "guests": ["11:22:33:44:55:66"]},
+        ...     "limits": [{"group": "guests", "up": 128, "down": 1024},
+        ...                {"group": "kids", "up": 64, "down": 256, "time": "21:00-07:00", "days": "sun-thu"}],
+        ...     "access": [{"group": "kids", "time": "07:00-22:00"}]})
+    Args:
+        groups:dict: {group: [mac, ...]}
+        limits:list: LimitRule(group, up, down, window). A rule without window always applies. The last active
+                     rule of a client wins, and clients without an active rule are unlimited.
+        access:list: AccessRule(group, window, urls_blocked). Clients may only connect in the window; the router
+                     itself enforces it, so it's written once.
+    """
+
+    def __init__(self, groups: dict, limits: list = (), access: list = ()):
+        self.groups = {name: [mac.lower() for mac in macs] for name, macs in groups.items()}
+        self.limits = list(limits)
+        self.access = list(access)
+        for rule in self.limits + self.access:
+            assert rule.group in self.groups, f"Unknown group: {rule.group}"
+
+    @classmethod
+    def from_dict(cls, config: dict) -> 'Policy':
+        """
+        Return a Policy from a dictionary like the one in the class example, ex: loaded from a JSON file.
+        """
+        def window(rule):
+            return Window(rule['time'], rule.get('days')) if rule.get('time') else None
+        limits = [LimitRule(r['group'], int(r.get('up', 0)), int(r.get('down', 0)), window(r))
+                  for r in config.get('limits', [])]
+        access = [AccessRule(r['group'], window(r), r.get('urls_blocked', '')) for r in config.get('access', [])]
+        return cls(config.get('groups', {}), limits, access)
+
+    def limits_at(self, now: datetime) -> dict:
+        """
+        Return {mac: (limit_up, limit_down)} of every client with limit rules at a time. (0, 0) is unlimited.
+        """
+        limits = {}
+        for rule in self.limits:
+            active = rule.window is None or rule.window.contains(now)
+            for mac in self.groups[rule.group]:
+                if active:
+                    limits[mac] = (rule.up, rule.down)
+                else:
+                    limits.setdefault(mac, (0, 0))
+        return limits
+
+    def parent_control(self) -> dict:
+        """
+        Return {mac: (status, time, days, urls_blocked)} arguments of set_parent_control() for every client.
+        """
+        rules = {}
+        for rule in self.access:
+            window = rule.window or Window('00:00-23:59')
+            for mac in self.groups[rule.group]:
+                rules[mac] = (1, window.time, window.router_days(), rule.urls_blocked)
+        return rules
+
+    def next_transition(self, now: datetime) -> datetime:
+        """
+        Return the next time a limit rule starts or stops applying, or None if no rule has a window.
+        """
+        times = [rule.window.next_transition(now) for rule in self.limits if rule.window is not None]
+        return min((t for t in times if t is not None), default=None)
+
+
+class PolicyEngine():
+    """
+    Keep a router in line with a Policy. Limits are written when a rule window opens or closes, and the whole
+    policy is reconciled every reconcile_interval seconds to undo changes made by hand.
+    Give the router a read cache (cache_ttl) so transitions between reconciles reuse the last read.
+        >>> engine = PolicyEngine(TendaAC15(url_base, password, cache_ttl=600), policy, reconcile_interval=900)
+        >>> engine.start()  # or engine.run() in the foreground
+    Args:
+        router:TendaAC15: Router client.
+        policy:Policy: Policy to enforce.
+        reconcile_interval:float: Seconds between reads from the router that bypass the cache.
+        retry_delay:float: Seconds before retrying a failed apply, doubled after every failure in a row, up to
+                           reconcile_interval.
+    """
+
+    def __init__(self, router, policy: Policy, reconcile_interval: float = 900, retry_delay: float = 10,
+                 clock=datetime.now):
+        self.router = router
+        self.policy = policy
+        self.reconcile_interval = reconcile_interval
+        self.retry_delay = retry_delay
+        self.stats = {'applies': 0, 'writes': 0, 'errors': 0}
+        self._clock = clock
+        self._parent_control = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def apply(self, now: datetime = None, refresh: bool = False) -> dict:
+        """
+        Write what differs between the router and the policy at a time.
+        Args:
+            now:datetime: Time to apply the policy at. Now if not set.
+            refresh:bool: Read the router instead of the cache, and recheck Parent Control written before.
+        Returns:
+            dict: {'limits': ConfigDiff, 'parent_control': {'aa:bb:cc:dd:ee:ff': '{"errCode":0}', ...}}
+        """
+        now = now or self._clock()
+        current = self.router.get_net_control(refresh)
+        limits = self.policy.limits_at(now)
+        desired = current[:1] + [dict(row) for row in current[1:]]
+        for row in desired[1:]:
+            limit = limits.pop(row["mac"].lower(), None)
+            if limit is not None:
+                row["limitUp"], row["limitDown"] = str(limit[0]), str(limit[1])
+        # Clients missing from the list are only added for a real limit.
+        desired += [{"hostName": mac, "mac": mac, "limitUp": str(up), "limitDown": str(down)}
+                    for mac, (up, down) in limits.items() if up or down]
+        diff = diff_net_control(current, desired)
+        if diff.changed:
+            self.router.set_net_control(desired)
+            self.stats['writes'] += 1
+        written = {}
+        for mac, rule in self.policy.parent_control().items():
+            if not refresh and self._parent_control.get(mac) == rule:
+                continue
+            status, time, days, urls = rule
+            current_rule = self.router.get_parent_control(mac)
+            if (current_rule.get('enable'), current_rule.get('time'), current_rule.get('day'),
+                    current_rule.get('urls')) != (status, time, days, urls):
+                written[mac] = self.router.set_parent_control(mac, status, time, days, urls)
+                self.stats['writes'] += 1
+            self._parent_control[mac] = rule
+        self.stats['applies'] += 1
+        return {'limits': diff, 'parent_control': written}
+
+    def run(self, count: int = None):
+        """
+        Apply the policy at every transition and reconcile until stop() is called. Failed applies are logged
+        and retried with backoff, or at the next transition if it comes first.
+        Args:
+            count:int: Number of applies. Forever if not set.
+        """
+        if self._thread is None:
+            self._stop.clear()
+        applies = 0
+        failures = 0
+        last_reconcile = None
+        while count is None or applies < count:
+            now = self._clock()
+            reconcile = last_reconcile is None or (now - last_reconcile).total_seconds() >= self.reconcile_interval
+            try:
+                self.apply(now, refresh=reconcile)
+                failures = 0
+                if reconcile:
+                    last_reconcile = now
+            except Exception as e:
+                failures += 1
+                self.stats['errors'] += 1
+                logger.warning('%s: policy apply failed: %r', self.router._URL_BASE, e)
+            applies += 1
+            if count is not None and applies >= count:
+                return
+            wake = now + timedelta(seconds=self.reconcile_interval)
+            if failures:
+                # A failed apply may have missed a transition that next_transition() no longer returns.
+                wake = now + timedelta(seconds=min(self.retry_delay * 2 ** (failures - 1), self.reconcile_interval))
+            transition = self.policy.next_transition(now)
+            if transition is not None and transition < wake:
+                wake = transition
+            if self._stop.wait(max((wake - self._clock()).total_seconds(), 0)):
+                return
+
+    def start(self) -> 'PolicyEngine':
+        """
+        Run in a background thread until stop() is called.
+        """
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run, name='tendawifi-policy', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout: float = None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
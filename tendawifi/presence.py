@@ -0,0 +1,68 @@
+"""
+Join, leave and change events of router clients, computed from successive online lists.
+"""
+import time
+from collections import namedtuple
+
+PresenceEvent = namedtuple('PresenceEvent', ['kind', 'device_id', 'client', 'changes', 'time'])
+
+# Online list keys watched for 'change' events.
+WATCHED = ('ip', 'devName', 'line')
+
+
+class PresenceTracker():
+    """
+    Track the online clients of a router by 'deviceId' and emit PresenceEvent objects:
+        join: A client appeared.
+        leave: A client has been missing for leave_after seconds.
+        change: The 'ip', 'devName' or 'line' (band) of a client changed. changes is {key: (old, new)}.
+    A client that leaves and comes back within leave_after seconds emits no event, to absorb Wi-Fi flapping.
+    Args:
+        leave_after:float: Seconds a client must be missing before its leave event.
+    """
+
+    def __init__(self, leave_after: float = 0, clock=time.time):
+        self.leave_after = leave_after
+        self.online = {}
+        self._missing = {}
+        self._clock = clock
+
+    def update(self, online_list: list, now: float = None) -> list:
+        """
+        Feed an online list and return the events since the previous one.
+        Args:
+            online_list:list: List returned by get_online_list() method.
+        Returns:
+            list: [PresenceEvent(kind, device_id, client, changes, time), ...]
+        """
+        now = self._clock() if now is None else now
+        events = []
+        current = {}
+        for client in online_list:
+            device_id = client["deviceId"].lower()
+            current[device_id] = client
+            previous = self.online.get(device_id)
+            self.online[device_id] = client
+            if previous is None:
+                events.append(PresenceEvent('join', device_id, client, {}, now))
+                continue
+            self._missing.pop(device_id, None)
+            changes = {key: (previous.get(key), client.get(key)) for key in WATCHED if previous.get(key) != client.get(key)}
+            if changes:
+                events.append(PresenceEvent('change', device_id, client, changes, now))
+        # Only scan for missing clients when some previously online one wasn't seen.
+        if len(current) < len(self.online):
+            for device_id in self.online:
+                if device_id not in current and device_id not in self._missing:
+                    self._missing[device_id] = now
+        for device_id, since in list(self._missing.items()):
+            if now - since >= self.leave_after:
+                del self._missing[device_id]
+                events.append(PresenceEvent('leave', device_id, self.online.pop(device_id), {}, now))
+        return events
+
+    def poll(self, router) -> list:
+        """
+        Fetch the online list of a TendaAC15 object and return the events since the previous poll.
+        """
+        return self.update(router.get_online_list(refresh=True))
@@ -0,0 +1,92 @@
+"""
+Cheap liveness and readiness checks of a router: TCP connect, HTTP reachability and session validity.
+"""
+import socket
+import time
+from collections import namedtuple
+from urllib.parse import urlsplit
+
+# tcp, http and session are latencies in seconds, None if the check failed or didn't run.
+# ok is whether the router is live. session_valid is None when there was no session to check,
+# and False when the router dropped it (live, session stale) and login wasn't requested.
+ProbeResult = namedtuple('ProbeResult', ['router', 'ok', 'tcp', 'http', 'session', 'session_valid', 'error'])
+
+# Smallest authenticated response of the firmware, a Parent Control rule of no client.
+SESSION_PATH = '/goform/GetParentControlInfo?mac='
+
+
+def probe(client, deadline: float = 2, login: bool = False) -> ProbeResult:
+    """
+    Probe a router, spending at most deadline seconds on it. Requests are sent once, without retries.
+    Args:
+        client:TendaAC15: Router client.
+        deadline:float: Max seconds of the whole probe.
+        login:bool: Whether to login when there is no session or it's stale, instead of only reporting it.
+    Returns:
+        ProbeResult: (router, ok, tcp, http, session, session_valid, error)
+    """
+    end = time.monotonic() + deadline
+    router = client._URL_BASE
+    latencies = {'tcp': None, 'http': None, 'session': None}
+    session_valid = None
+
+    def remaining() -> float:
+        left = end - time.monotonic()
+        if left <= 0:
+            raise TimeoutError(f'Probe deadline of {deadline} seconds exceeded')
+        return left
+
+    def send(method: str, url: str, **kwargs):
+        if not client._slots.acquire(timeout=remaining()):
+            raise TimeoutError('No free request slot before the probe deadline')
+        try:
+            return client._session.request(method, url, allow_redirects=False, timeout=remaining(), **kwargs)
+        finally:
+            client._slots.release()
+
+    def login_again(stale):
+        # Logged in here rather than by the client, whose retries wouldn't respect the deadline.
+        if not client._login_lock.acquire(timeout=remaining()):
+            raise TimeoutError('Login of another thread still running at the probe deadline')
+        try:
+            if client._cookies and client._cookies is not stale:
+                return client._cookies
+            r = send('POST', client._URLS['login'], data=client._AUTH_DATA)
+            assert r.status_code == 302 and r.cookies, f"Login failed with http status code: {r.status_code}"
+            client.stats['logins'] += 1
+            client._cookies = r.cookies
+            return r.cookies
+        finally:
+            client._login_lock.release()
+
+    try:
+        url = urlsplit(router)
+        start = time.monotonic()
+        with socket.create_connection((url.hostname, url.port or (443 if url.scheme == 'https' else 80)),
+                                      timeout=remaining()):
+            latencies['tcp'] = time.monotonic() - start
+        start = time.monotonic()
+        r = send('GET', router + '/')
+        assert r.status_code < 500, f"Invalid http status code: {r.status_code}"
+        latencies['http'] = time.monotonic() - start
+        cookies = client._cookies
+        for attempt in range(2):
+            if not cookies and login:
+                cookies = login_again(cookies)
+            if not cookies:
+                break
+            start = time.monotonic()
+            r = send('GET', router + SESSION_PATH, cookies=cookies)
+            session_valid = r.status_code == 200 and not client._session_expired(r)
+            if session_valid:
+                latencies['session'] = time.monotonic() - start
+                break
+            if not login or attempt:
+                break
+            # The router dropped the session: drop the stale cookie too, so the next pass logs in again.
+            if client._cookies is cookies:
+                client._cookies = None
+            cookies = None
+    except Exception as e:
+        return ProbeResult(router, False, latencies['tcp'], latencies['http'], latencies['session'], session_valid, e)
+    return ProbeResult(router, True, latencies['tcp'], latencies['http'], latencies['session'], session_valid, None)
@@ -0,0 +1,116 @@
+"""
+Retry, timeout and circuit breaker policy of router requests.
+"""
+import random
+import threading
+import time
+import requests
+
+
+class CircuitOpenError(requests.ConnectionError):
+    """
+    Raised without any network I/O while the circuit breaker of a router is open.
+    """
+
+
+class CircuitBreaker():
+    """
+    Fail fast for a router known to be down. After failure_threshold failed requests in a row the circuit opens,
+    and requests fail right away. After reset_timeout seconds a single probe request is let through:
+    if it succeeds the circuit closes, otherwise it stays open for another reset_timeout. A probe that never
+    reports back (ex. cancelled) is given up after reset_timeout too, and another one let through.
+    """
+
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 30, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.state = 'closed'
+        self._opened_at = 0
+        self._clock = clock
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """
+        Return whether a request may be sent now.
+        """
+        with self._lock:
+            if self.state == 'closed':
+                return True
+            now = self._clock()
+            if now >= self._opened_at + self.reset_timeout:
+                self.state = 'half_open'
+                self._opened_at = now
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.state = 'closed'
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == 'half_open' or self.failures >= self.failure_threshold:
+                self.state = 'open'
+                self._opened_at = self._clock()
+
+
+class RetryPolicy():
+    """
+    How router requests are retried and timed out. A policy holds no state, so it can be shared by many clients;
+    each client gets its own circuit breaker from breaker().
+    Args:
+        tries:int: Max attempts of a request.
+        delay:float: Seconds before the first retry.
+        backoff:float: Multiplier of the delay after every retry.
+        jitter:float|tuple: Seconds added to the delay after every retry, or a (min, max) range of random seconds.
+        max_delay:float: Max seconds between retries.
+        deadline:float: Max seconds of a client call including its login, session renewal and retries. Unlimited if
+                        not set.
+        timeout:float|tuple: Default (connect, read) timeout of every attempt.
+        timeouts:dict: Timeouts per endpoint ex: {'login': (5, 5), 'GetOnlineList': (3, 10)}
+        failure_threshold:int: Failed requests in a row that open the circuit breaker. No breaker if not set.
+        reset_timeout:float: Seconds the circuit stays open before a probe request.
+    """
+
+    def __init__(self, tries: int = 3, delay: float = 1, backoff: float = 1.5, jitter=(1, 1.5), max_delay: float = None,
+                 deadline: float = None, timeout=(3, 3), timeouts: dict = None, failure_threshold: int = None,
+                 reset_timeout: float = 30):
+        assert tries >= 1, "tries must be at least 1."
+        self.tries = tries
+        self.delay = delay
+        self.backoff = backoff
+        self.jitter = jitter
+        self.max_delay = max_delay
+        self.deadline = deadline
+        self.timeout = timeout
+        self.timeouts = dict(timeouts or {})
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+    def timeout_for(self, endpoint: str, remaining: float = None):
+        """
+        Return the timeout of an endpoint, shortened to the remaining seconds of the deadline.
+        """
+        timeout = self.timeouts.get(endpoint, self.timeout)
+        if remaining is None:
+            return timeout
+        remaining = max(remaining, 0.001)
+        if isinstance(timeout, tuple):
+            return tuple(min(t, remaining) for t in timeout)
+        return min(timeout, remaining) if timeout else remaining
+
+    def next_delay(self, delay: float) -> float:
+        delay *= self.backoff
+        delay += random.uniform(*self.jitter) if isinstance(self.jitter, tuple) else self.jitter
+        return min(delay, self.max_delay) if self.max_delay is not None else delay
+
+    def breaker(self) -> CircuitBreaker:
+        """
+        Return a new circuit breaker for a client, or None if the policy has none.
+        """
+        if not self.failure_threshold:
+            return None
+        return CircuitBreaker(self.failure_threshold, self.reset_timeout)
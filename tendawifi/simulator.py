@@ -0,0 +1,361 @@
+"""
+Fake Tenda AC15 HTTP server, to test and benchmark clients without a router.
+
+    $ python -m tendawifi.simulator --port 8080 --clients 250 --latency 0.02
+"""
+import argparse
+import copy
+import hashlib
+import json
+import logging
+import random
+import secrets
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+from . import codec
+logger = logging.getLogger(__name__)
+
+
+def _md5(text: str) -> str:
+    return hashlib.md5(str.encode(text)).hexdigest()
+
+
+def make_clients(count: int, seed: int = 0) -> list:
+    """
+    Return a list of fake online clients like the ones returned by get_online_list() method.
+    """
+    rnd = random.Random(seed)
+    clients = []
+    for i in range(count):
+        block, host = divmod(i, 250)
+        clients.append({"deviceId": "02:00:00:%02x:%02x:%02x" % (i >> 16 & 255, i >> 8 & 255, i & 255),
+                        "ip": "192.168.%d.%d" % (1 + block, 2 + host),
+                        "devName": "Client%d" % i, "line": str(rnd.choice((0, 1, 2))),
+                        "uploadSpeed": "%.2f" % rnd.uniform(0, 500), "downloadSpeed": "%.2f" % rnd.uniform(0, 5000),
+                        "linkType": "wireless" if i % 3 else "wired", "black": 0,
+                        "isGuestClient": "true" if i % 10 == 9 else "false"})
+    return clients
+
+
+class FakeAC15():
+    """
+    Threaded HTTP server with the login and goform endpoints of a Tenda AC15.
+    Args:
+        password:str: Router password.
+        clients:int: Number of fake online clients.
+        latency:float: Seconds added to every response.
+        jitter:float: Max random seconds added on top of latency.
+        error_rate:float: Probability of answering a request with a 500 error.
+        reboot_time:float: Seconds the router is down after a reboot request.
+        wan_time:float: Seconds the WAN stays disconnected once the router is back from a reboot.
+        shutdown_delay:float: Seconds the router keeps answering after a reboot request before going down.
+        host:str: Address to listen on.
+        port:int: Port to listen on. 0 picks a free one.
+    """
+
+    def __init__(self, password: str = "1234", clients: int = 10, latency: float = 0, jitter: float = 0,
+                 error_rate: float = 0, reboot_time: float = 0, host: str = "127.0.0.1", port: int = 0, seed: int = 0,
+                 wan_time: float = 0, shutdown_delay: float = 0):
+        self.password = _md5(password)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.reboot_time = reboot_time
+        self.wan_time = wan_time
+        self.shutdown_delay = shutdown_delay
+        self.host = host
+        self.port = port
+        self.sessions = set()
+        self.stats = {'logins': 0, 'requests': 0, 'errors': 0}
+        self.forms = {}
+        self._random = random.Random(seed)
+        self._down_from = 0
+        self._down_until = 0
+        self._wan_down_until = 0
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+        self.online_list = make_clients(clients, seed)
+        self.net_control = [{'netControlEn': '1'}] + [
+            {'upSpeed': c['uploadSpeed'], 'downSpeed': c['downloadSpeed'], 'devType': 'unknown', 'hostName': c['devName'],
+             'ip': c['ip'], 'mac': c['deviceId'], 'limitUp': '0', 'limitDown': '0', 'isControled': '0', 'offline': '0',
+             'isSet': '0'} for c in self.online_list]
+        self.ipmac_bind = {'lanIp': '192.168.1.1', 'lanMask': '255.255.255.0', 'dhttpIP': '', 'dhcpClientList': [],
+                           'bindList': []}
+        self.vports = {'lanIp': '192.168.1.1', 'lanMask': '255.255.255.0', 'virtualList': []}
+        self.parent_control = {}
+        self.router_status = {"wl5gEn": "1", "wl5gName": "FakeAC15", "wl24gEn": "1", "wl24gName": "FakeAC15",
+                              "lineup": "1|0|0|1", "usbNum": "0", "clientNum": clients, "blackNum": 0, "listNum": 0,
+                              "deviceName": "AC15", "lanIP": "192.168.1.1", "lanMAC": "CC:2D:21:00:00:01",
+                              "workMode": "router", "apStatus": "1310007",
+                              "wanInfo": [{"wanStatus": "1310007", "wanIp": "10.0.0.2", "wanUploadSpeed": "20.56",
+                                           "wanDownloadSpeed": "648.83"}],
+                              "onlineUpgradeInfo": {"newVersionExist": "0", "newVersion": "", "curVersion": "V15.03.05.20_multi"}}
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def start(self) -> 'FakeAC15':
+        self._server = ThreadingHTTPServer((self.host, self.port), _Handler)
+        self._server.daemon_threads = True
+        self._server.router = self
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, args=(0.05,), name='fake-ac15', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def expire_sessions(self):
+        """
+        Drop every session, like the router does after its idle timeout.
+        """
+        with self._lock:
+            self.sessions.clear()
+
+    @property
+    def is_down(self) -> bool:
+        return self._down_from <= time.monotonic() < self._down_until
+
+    def _delay(self):
+        delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0)
+        if delay:
+            time.sleep(delay)
+
+    def handle(self, method: str, path: str, query: dict, form: dict, cookies: dict):
+        """
+        Return (status, headers, body) of a request.
+        """
+        with self._lock:
+            self.stats['requests'] += 1
+            if self.is_down:
+                self.sessions.clear()
+                self.stats['errors'] += 1
+                return 503, {}, ''
+            if self.error_rate and self._random.random() < self.error_rate:
+                self.stats['errors'] += 1
+                return 500, {}, 'Internal Server Error'
+        if path == '/login/Auth' and method == 'POST':
+            return self._login(form)
+        if path == '/' or path.endswith('.html'):
+            return 200, {'Content-Type': 'text/html'}, '<html><title>Tenda</title></html>'
+        if cookies.get('password') not in self.sessions:
+            return 302, {'Location': '/login.html'}, ''
+        with self._lock:
+            handler = _GETS.get(path) if method in ('GET', 'HEAD') else _POSTS.get(path)
+            if handler is None:
+                return 404, {}, ''
+            return handler(self, query, form)
+
+    def _login(self, form: dict):
+        with self._lock:
+            self.stats['logins'] += 1
+            if form.get('username') != 'admin' or form.get('password') != self.password:
+                return 302, {'Location': '/login.html?0'}, ''
+            token = secrets.token_hex(8)
+            self.sessions.add(token)
+        return 302, {'Location': '/main.html', 'Set-Cookie': f'password={token}; path=/'}, ''
+
+    def _json(self, data):
+        return 200, {'Content-Type': 'application/json'}, json.dumps(data)
+
+    def _ok(self):
+        return 200, {'Content-Type': 'application/json'}, '{"errCode":0}'
+
+    def _get_online_list(self, query, form):
+        return self._json([{"onlineNum": len(self.online_list)}] + self.online_list)
+
+    def _get_net_control(self, query, form):
+        return self._json(self.net_control)
+
+    def _get_ipmac_bind(self, query, form):
+        return self._json(self.ipmac_bind)
+
+    def _get_vports(self, query, form):
+        return self._json(self.vports)
+
+    def _get_router_status(self, query, form):
+        status = copy.deepcopy(self.router_status)
+        status['clientNum'] = len(self.online_list)
+        if time.monotonic() < self._wan_down_until:
+            for wan in status['wanInfo']:
+                wan.update(wanStatus='0', wanIp='', wanUploadSpeed='0', wanDownloadSpeed='0')
+        return self._json(status)
+
+    def _get_parent_control(self, query, form):
+        mac = query.get('mac', '')
+        return self._json(self.parent_control.get(mac.lower(), {'enable': 0, 'mac': mac, 'url_enable': 0, 'urls': '',
+                                                                'time': '00:00-00:00', 'day': '1,1,1,1,1,1,1',
+                                                                'limit_type': 1}))
+
+    def _set_parent_control(self, query, form):
+        mac = form.get('deviceId', '')
+        self.parent_control[mac.lower()] = {'enable': int(form.get('enable', 0)), 'mac': mac,
+                                            'url_enable': int(form.get('url_enable', 0)), 'urls': form.get('urls', ''),
+                                            'time': form.get('time', ''), 'day': form.get('day', ''),
+                                            'limit_type': int(form.get('limit_type', 0))}
+        return self._ok()
+
+    def _set_net_control(self, query, form):
+        rows = {r['mac'].lower(): (r['hostName'], r['limitUp'], r['limitDown'])
+                for r in codec.NET_CONTROL.decode(form.get('list', ''))}
+        table = [self.net_control[0]]
+        for row in self.net_control[1:]:
+            new = rows.pop(row['mac'].lower(), None)
+            if new is None:
+                table.append(dict(row, limitUp='0', limitDown='0', isSet='0'))
+            else:
+                table.append(dict(row, hostName=new[0], limitUp=new[1], limitDown=new[2], isSet='1'))
+        for mac, (host_name, limit_up, limit_down) in rows.items():
+            table.append({'upSpeed': '0', 'downSpeed': '0', 'devType': 'unknown', 'hostName': host_name, 'ip': '',
+                          'mac': mac, 'limitUp': limit_up, 'limitDown': limit_down, 'isControled': '0', 'offline': '1',
+                          'isSet': '1'})
+        self.net_control = table
+        return self._ok()
+
+    def _set_ipmac_bind(self, query, form):
+        bind_list = [{'ipaddr': r['ipaddr'], 'macaddr': r['macaddr'], 'devname': r['devname'], 'status': '1'}
+                     for r in codec.IPMAC_BIND.decode(form.get('list', ''))]
+        if int(form.get('bindnum', -1)) != len(bind_list):
+            return 200, {'Content-Type': 'application/json'}, '{"errCode":1}'
+        self.ipmac_bind = dict(self.ipmac_bind, bindList=bind_list)
+        return self._ok()
+
+    def _set_vports(self, query, form):
+        virtual_list = codec.VPORTS.decode(form.get('list', ''))
+        self.vports = dict(self.vports, virtualList=virtual_list)
+        return self._ok()
+
+    def _set_password(self, query, form):
+        if form.get('SYSOPS') != self.password:
+            return 302, {'Location': '/system_password.html'}, ''
+        self.password = form.get('SYSPS', self.password)
+        self.sessions.clear()
+        return 302, {'Location': '/login.html'}, ''
+
+    def _reboot(self, query, form):
+        self.sessions.clear()
+        self._down_from = time.monotonic() + self.shutdown_delay
+        self._down_until = self._down_from + self.reboot_time
+        self._wan_down_until = self._down_until + self.wan_time
+        return 302, {'Location': '/'}, ''
+
+
+def _form_handler(name: str):
+    """
+    Return a handler that just stores the form of a settings endpoint.
+    """
+    def handler(router, query, form):
+        router.forms[name] = form
+        if name == 'SetupWIFI':
+            router.router_status['wl24gName'] = router.router_status['wl5gName'] = form.get('ssid', '')
+        return router._ok()
+    return handler
+
+
+_GETS = {
+    '/goform/getOnlineList': FakeAC15._get_online_list,
+    '/goform/GetNetControlList': FakeAC15._get_net_control,
+    '/goform/GetIpMacBind': FakeAC15._get_ipmac_bind,
+    '/goform/GetVirtualServerCfg': FakeAC15._get_vports,
+    '/goform/GetRouterStatus': FakeAC15._get_router_status,
+    '/goform/GetParentControlInfo': FakeAC15._get_parent_control,
+}
+
+_POSTS = {
+    '/goform/saveParentControlInfo': FakeAC15._set_parent_control,
+    '/goform/SetNetControlList': FakeAC15._set_net_control,
+    '/goform/SetIpMacBind': FakeAC15._set_ipmac_bind,
+    '/goform/SetVirtualServerCfg': FakeAC15._set_vports,
+    '/goform/WifiWpsSet': _form_handler('SetWPS'),
+    '/goform/WifiBasicSet': _form_handler('SetupWIFI'),
+    '/goform/SetSysAutoRebbotCfg': _form_handler('SetAutoreboot'),
+    '/goform/fast_setting_internet_set': _form_handler('SetFastInternet'),
+    '/goform/fast_setting_wifi_set': _form_handler('SetFastRouter'),
+    '/goform/SysToolChangePwd': FakeAC15._set_password,
+    '/goform/SysToolReboot': FakeAC15._reboot,
+}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Send headers and body in one segment, or delayed ACKs add ~40 ms to every keep-alive request.
+    wbufsize = 64 * 1024
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        logger.debug(format, *args)
+
+    def _serve(self, method: str):
+        router = self.server.router
+        url = urlsplit(self.path)
+        query = {k: v[-1] for k, v in parse_qs(url.query, keep_blank_values=True).items()}
+        form = {}
+        if method == 'POST':
+            length = int(self.headers.get('Content-Length') or 0)
+            body = self.rfile.read(length).decode() if length else ''
+            form = {k: v[-1] for k, v in parse_qs(body, keep_blank_values=True).items()}
+        cookies = {}
+        for item in (self.headers.get('Cookie') or '').split(';'):
+            name, _, value = item.strip().partition('=')
+            if name:
+                cookies[name] = value
+        router._delay()
+        status, headers, body = router.handle(method, url.path, query, form, cookies)
+        data = body.encode()
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        if method != 'HEAD':
+            self.wfile.write(data)
+
+    def do_GET(self):
+        self._serve('GET')
+
+    def do_POST(self):
+        self._serve('POST')
+
+    def do_HEAD(self):
+        self._serve('HEAD')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fake Tenda AC15 router.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--password', default='1234')
+    parser.add_argument('--clients', type=int, default=10)
+    parser.add_argument('--latency', type=float, default=0)
+    parser.add_argument('--jitter', type=float, default=0)
+    parser.add_argument('--error-rate', type=float, default=0)
+    parser.add_argument('--reboot-time', type=float, default=0)
+    parser.add_argument('--wan-time', type=float, default=0)
+    parser.add_argument('--shutdown-delay', type=float, default=0)
+    args = parser.parse_args()
+    router = FakeAC15(args.password, args.clients, args.latency, args.jitter, args.error_rate, args.reboot_time,
+                      args.host, args.port, wan_time=args.wan_time,
+                      shutdown_delay=args.shutdown_delay).start()
+    print(f'Fake AC15 listening on {router.url}')
+    try:
+        router._thread.join()
+    except KeyboardInterrupt:
+        router.stop()
+
+
+if __name__ == '__main__':
+    main()
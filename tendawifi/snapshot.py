@@ -0,0 +1,107 @@
+"""
+Indexed view of the clients of a router, joined on MAC address from several router tables.
+"""
+from bisect import bisect_left, bisect_right
+
+
+def _mac(mac: str) -> str:
+    return mac.strip().lower().replace('-', ':')
+
+
+class ClientSnapshot():
+    """
+    Clients from get_online_list(), get_ipmac_bind() and get_net_control() joined on MAC address,
+    with indexes by MAC, IP, last IP octet and case-folded name. Every record is a dictionary:
+        {'mac': 'aa:bb:cc:dd:ee:ff', 'ip': '192.168.1.100', 'name': 'ClientName',
+         'online': {...} or None, 'bind': {...} or None, 'net_control': {...} or None}
+    Args:
+        online_list:list: List returned by get_online_list() method.
+        ipmac_bind:dict: Dictionary returned by get_ipmac_bind() method.
+        net_control:list: List returned by get_net_control() method.
+    """
+
+    def __init__(self, online_list: list, ipmac_bind: dict = None, net_control: list = None):
+        self._by_mac = {}
+        tables = (
+            ('online', online_list or [], 'deviceId', 'ip', 'devName'),
+            ('bind', (ipmac_bind or {}).get('bindList', []), 'macaddr', 'ipaddr', 'devname'),
+            ('net_control', (net_control or [])[1:], 'mac', 'ip', 'hostName'),
+        )
+        for table, rows, mac_key, ip_key, name_key in tables:
+            for row in rows:
+                mac = _mac(row[mac_key])
+                record = self._by_mac.get(mac)
+                if record is None:
+                    record = self._by_mac[mac] = {'mac': mac, 'ip': '', 'name': '',
+                                                  'online': None, 'bind': None, 'net_control': None}
+                record[table] = row
+                # The first table wins: the online list is the most current, then reservations.
+                record['ip'] = record['ip'] or row.get(ip_key, '')
+                record['name'] = record['name'] or row.get(name_key, '')
+        self._by_ip = {}
+        self._by_name = {}
+        octets = []
+        for record in self._by_mac.values():
+            if record['ip']:
+                self._by_ip[record['ip']] = record
+                last = record['ip'].rpartition('.')[2]
+                if last.isdigit():
+                    octets.append((int(last), record['mac']))
+            self._by_name.setdefault(record['name'].casefold(), []).append(record)
+        octets.sort()
+        self._octets = [octet for octet, _ in octets]
+        self._octet_macs = [mac for _, mac in octets]
+
+    @classmethod
+    def from_router(cls, router, refresh: bool = False) -> 'ClientSnapshot':
+        """
+        Build a snapshot with a single fetch of each table of a TendaAC15 object.
+        """
+        return cls(router.get_online_list(refresh), router.get_ipmac_bind(refresh), router.get_net_control(refresh))
+
+    def __len__(self):
+        return len(self._by_mac)
+
+    def __iter__(self):
+        return iter(self._by_mac.values())
+
+    def __contains__(self, mac: str):
+        return _mac(mac) in self._by_mac
+
+    def online(self) -> list:
+        """
+        Return the records of online clients.
+        """
+        return [record for record in self._by_mac.values() if record['online'] is not None]
+
+    def by_mac(self, mac: str) -> dict:
+        """
+        Return the record of a MAC address ex: "AA:BB:CC:DD:EE:FF", or None.
+        """
+        return self._by_mac.get(_mac(mac))
+
+    def by_ip(self, ip: str) -> dict:
+        """
+        Return the record of an IP address ex: "192.168.1.100", or None.
+        """
+        return self._by_ip.get(ip)
+
+    def by_name(self, name: str) -> list:
+        """
+        Return the records whose name is equal to name, ignoring case.
+        """
+        return list(self._by_name.get(name.casefold(), ()))
+
+    def find_name(self, str_in_name: str) -> list:
+        """
+        Return the records whose name contains str_in_name, ignoring case.
+        """
+        needle = str_in_name.casefold()
+        return [record for name, records in self._by_name.items() if needle in name for record in records]
+
+    def by_iprange(self, ip_from: int, ip_to: int) -> list:
+        """
+        Return the records whose last IP octet is between ip_from and ip_to (both included) ex: 100, 150
+        """
+        lo, hi = bisect_left(self._octets, int(ip_from)), bisect_right(self._octets, int(ip_to))
+        return [self._by_mac[mac] for mac in self._octet_macs[lo:hi]]
@@ -0,0 +1,135 @@
+"""
+Poll client and WAN throughput of a router at a fixed interval.
+"""
+import logging
+import threading
+import time
+from collections import deque, namedtuple
+logger = logging.getLogger(__name__)
+
+ClientSample = namedtuple('ClientSample', ['time', 'router', 'device_id', 'ip', 'name',
+                                           'upload_speed', 'download_speed'])
+WanSample = namedtuple('WanSample', ['time', 'router', 'upload_speed', 'download_speed'])
+
+
+def _float(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class Poller():
+    """
+    Fixed interval poller of get_online_list() and get_router_status(), keeping the recent samples in a ring buffer.
+    Ticks are scheduled from the start time, so they don't drift. A poll that runs longer than
+    the interval skips the ticks it overlapped instead of queuing them.
+    Args:
+        router:TendaAC15: Router client. Its session is reused by every poll.
+        interval:float: Seconds between polls.
+        clients:bool: Whether to sample per client speeds.
+        wan:bool: Whether to sample WAN speeds.
+        maxlen:int: Max samples kept in the ring buffer.
+        callback:callable: Function called with the list of samples of every poll.
+    """
+
+    def __init__(self, router, interval: float = 5, clients: bool = True, wan: bool = True, maxlen: int = 10000,
+                 callback=None, clock=time.monotonic, wall_clock=time.time):
+        self.router = router
+        self.interval = interval
+        self.clients = clients
+        self.wan = wan
+        self.callback = callback
+        self.buffer = deque(maxlen=maxlen)
+        self.stats = {'polls': 0, 'skipped': 0, 'errors': 0}
+        self._clock = clock
+        self._wall_clock = wall_clock
+        self._stop = threading.Event()
+        self._thread = None
+
+    def poll(self) -> list:
+        """
+        Poll the router once.
+        Returns:
+            list: [ClientSample(...), ..., WanSample(...)]
+        """
+        now = self._wall_clock()
+        name = self.router._URL_BASE
+        samples = []
+        if self.clients:
+            for client in self.router.get_online_list(refresh=True):
+                samples.append(ClientSample(now, name, client["deviceId"], client.get("ip", ""), client.get("devName", ""),
+                                            _float(client.get("uploadSpeed")), _float(client.get("downloadSpeed"))))
+        if self.wan:
+            wan_info = self.router.get_router_status(refresh=True).get("wanInfo") or []
+            samples.append(WanSample(now, name, sum(_float(w.get("wanUploadSpeed")) for w in wan_info),
+                                     sum(_float(w.get("wanDownloadSpeed")) for w in wan_info)))
+        self.stats['polls'] += 1
+        self.buffer.extend(samples)
+        if self.callback is not None:
+            self.callback(samples)
+        return samples
+
+    def samples(self, count: int = None):
+        """
+        Poll at the fixed interval and yield every sample. Failed polls are logged and skipped.
+        Args:
+            count:int: Number of polls. Forever if not set, until stop() is called.
+        Returns:
+            generator: ClientSample and WanSample objects.
+        """
+        if self._thread is None:
+            self._stop.clear()
+        start = self._clock()
+        tick = 0
+        while count is None or tick < count:
+            try:
+                yield from self.poll()
+            except Exception as e:
+                self.stats['errors'] += 1
+                logger.warning('%s: poll failed: %r', self.router._URL_BASE, e)
+            tick += 1
+            elapsed = self._clock() - start
+            due = int(elapsed // self.interval) + 1
+            if count is not None:
+                due = min(due, count)
+            if due > tick:
+                self.stats['skipped'] += due - tick
+                tick = due
+            if (count is not None and tick >= count) or self._stop.wait(start + tick * self.interval - self._clock()):
+                return
+
+    def run(self, count: int = None):
+        """
+        Poll at the fixed interval, only calling the callback.
+        """
+        for _ in self.samples(count):
+            pass
+
+    def start(self) -> 'Poller':
+        """
+        Poll in a background thread until stop() is called.
+        """
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run, name='tendawifi-poller', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout: float = None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def window(self, seconds: float) -> list:
+        """
+        Return the buffered samples of the last seconds.
+        """
+        since = self._wall_clock() - seconds
+        samples = []
+        for sample in reversed(self.buffer):
+            if sample.time < since:
+                break
+            samples.append(sample)
+        samples.reverse()
+        return samples
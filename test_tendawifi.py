@@ -1,7 +1,10 @@
+import asyncio
 import pytest
-import reqtry
+import requests
 import tendawifi
+from tendawifi.simulator import FakeAC15
 import hashlib
+import time
 
 
 URL_BASE = 'http://localhost'
@@ -62,7 +65,7 @@ class MockPostResponse:
 
 @ pytest.fixture
 def mock_response(monkeypatch):
-    def mock_reqtry_get(*args, **kwargs):
+    def mock_get(*args, **kwargs):
         if args[0] == "http://test.com":
             return MockGetResponse({"success": True}, 200)
         if args[0] == URLS["GetParentControl"] + 'aa:bb:cc:dd:ee:ff':
@@ -77,7 +80,7 @@ def mock_response(monkeypatch):
             return MockGetResponse(RESP["GetOnlineList"], 200)
         return MockGetResponse(None, 404)
 
-    def mock_reqtry_post(*args, **kwargs):
+    def mock_post(*args, **kwargs):
         if args[0] == URLS["login"]:
             return MockPostResponse(True, 302)
         if args[0] == URLS["SetParentControl"] and kwargs["data"] == {"deviceId": 'aa:bb:cc:dd:ee:ff', "enable": 1, "time": "06:00-06:05", "url_enable": 0, "urls": "", "day": "1,1,1,1,1,1,1", "limit_type": 0}:
@@ -100,8 +103,10 @@ def mock_response(monkeypatch):
             return MockPostResponse(True, 302, headers={"Location": "login"})
         return MockPostResponse(None, 404)
 
-    monkeypatch.setattr(reqtry, "get", mock_reqtry_get)
-    monkeypatch.setattr(reqtry, "post", mock_reqtry_post)
+    def mock_session_request(self, method, url, **kwargs):
+        return (mock_get if method == 'GET' else mock_post)(url, **kwargs)
+
+    monkeypatch.setattr(requests.Session, "request", mock_session_request)
 
 
 @ pytest.fixture
@@ -207,3 +212,822 @@ def test_set_autoreboot(mock_response, tenda):
 
 def test_set_password(mock_response, tenda):
     tenda.set_router_password("1234", "1234")
+
+
+def test_session_reused(mock_response, tenda):
+    tenda.get_vports()
+    tenda.get_net_control()
+    tenda.set_wps_status(1)
+    assert tenda.stats == {'logins': 1, 'requests': 3}
+
+
+def test_session_expired_relogin(monkeypatch, mock_response, tenda):
+    responses = [MockGetResponse(None, 302), MockGetResponse(RESP["GetVports"], 200)]
+    monkeypatch.setattr(tenda, "_request", lambda method, url, **kwargs: responses.pop(0)
+                        if method == 'GET' else MockPostResponse(True, 302))
+    r = tenda.get_vports()
+    assert r == RESP["GetVports"]
+    assert tenda.stats == {'logins': 2, 'requests': 2}
+
+
+def test_session_pool(mock_response):
+    with tendawifi.TendaAC15("http://localhost", "1234", pool_size=2, timeout=(1, 2)) as tenda:
+        adapter = tenda._session.get_adapter("http://localhost")
+        assert adapter._pool_maxsize == 2
+        assert tenda.get_vports() == RESP["GetVports"]
+
+
+def test_request_retries(monkeypatch, tenda):
+    calls = []
+
+    def flaky_request(self, method, url, **kwargs):
+        calls.append(url)
+        if len(calls) < 3:
+            raise requests.ConnectionError("Connection refused")
+        return MockGetResponse({"success": True}, 200)
+    monkeypatch.setattr(requests.Session, "request", flaky_request)
+    monkeypatch.setattr(tendawifi.time, "sleep", lambda s: None)
+    r = tenda._request('GET', "http://test.com")
+    assert r.status_code == 200
+    assert len(calls) == 3
+
+
+def test_async_client():
+    aiohttp = pytest.importorskip("aiohttp")
+    from aiohttp import web
+    from tendawifi.aio import AsyncTendaAC15, gather_fleet
+
+    async def login(request):
+        resp = web.Response(status=302, headers={"Location": "/main.html"})
+        resp.set_cookie("password", "abc")
+        return resp
+
+    async def online_list(request):
+        if request.cookies.get("password") != "abc":
+            return web.Response(status=302, headers={"Location": "/login.html"})
+        return web.json_response(RESP["GetOnlineList"])
+
+    async def main():
+        app = web.Application()
+        app.router.add_post("/login/Auth", login)
+        app.router.add_get("/goform/getOnlineList", online_list)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        limit = asyncio.Semaphore(2)
+        clients = [AsyncTendaAC15(f"http://127.0.0.1:{port}", "1234", global_limit=limit) for _ in range(3)]
+        try:
+            results = await gather_fleet(clients, "get_online_list")
+            results += await gather_fleet(clients, "get_online_list")
+        finally:
+            for client in clients:
+                await client.close()
+            await runner.cleanup()
+        return clients, results
+
+    clients, results = asyncio.run(main())
+    assert results == [RESP["GetOnlineList"][1:]] * 6
+    assert all(client.stats == {'logins': 1, 'requests': 2} for client in clients)
+
+
+def test_async_client_built_outside_loop():
+    aiohttp = pytest.importorskip("aiohttp")
+    from aiohttp import web
+    from tendawifi.aio import AsyncTendaAC15
+
+    async def login(request):
+        resp = web.Response(status=302, headers={"Location": "/main.html"})
+        resp.set_cookie("password", "abc")
+        return resp
+
+    async def online_list(request):
+        if request.cookies.get("password") != "abc":
+            return web.Response(status=302, headers={"Location": "/login.html"})
+        await asyncio.sleep(0.01)
+        return web.json_response(RESP["GetOnlineList"])
+
+    client = AsyncTendaAC15("http://127.0.0.1", "1234", limit=1)
+
+    async def main():
+        app = web.Application()
+        app.router.add_post("/login/Auth", login)
+        app.router.add_get("/goform/getOnlineList", online_list)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        client._URL_BASE = f"http://127.0.0.1:{port}"
+        client._URLS = {name: url.replace("http://127.0.0.1", client._URL_BASE) for name, url in client._URLS.items()}
+        try:
+            return await asyncio.gather(*(client.get_online_list() for _ in range(4)))
+        finally:
+            await client.close()
+            await runner.cleanup()
+
+    assert asyncio.run(main()) == [RESP["GetOnlineList"][1:]] * 4
+    assert client.stats == {'logins': 1, 'requests': 4}
+
+
+def test_auth_data_per_instance():
+    t1 = tendawifi.TendaAC15("http://localhost", "1234")
+    t2 = tendawifi.TendaAC15("http://10.0.0.1", "5678")
+    assert t1._AUTH_DATA["password"] == hashlib.md5(b"1234").hexdigest()
+    assert t2._AUTH_DATA["password"] == hashlib.md5(b"5678").hexdigest()
+
+
+def test_fleet_run(mock_response):
+    with tendawifi.TendaFleet([("http://localhost", "1234"), ("http://10.0.0.1", "1234")], max_workers=2) as fleet:
+        r = fleet.run("get_vports")
+    assert list(r) == ["http://localhost", "http://10.0.0.1"]
+    assert r["http://localhost"].result == RESP["GetVports"]
+    assert r["http://localhost"].error is None
+    assert r["http://10.0.0.1"].result is None
+    assert isinstance(r["http://10.0.0.1"].error, AssertionError)
+    with pytest.raises(ValueError):
+        tendawifi.TendaFleet([("http://localhost", "1234"), tendawifi.TendaAC15("http://localhost", "5678")])
+
+
+def test_cache(mock_response):
+    tenda = tendawifi.TendaAC15("http://localhost", "1234", cache_ttl={'GetNetControl': 60, 'GetIpMacBind': 60})
+    tenda.filter_bindlist_by_devname("clientname1")
+    tenda.filter_bindlist_by_devname("clientname2")
+    tenda.get_net_control()
+    net_control = tenda.get_net_control()
+    net_control[1]['limitUp'] = '100'
+    assert tenda.get_net_control() == RESP["GetNetControl"]
+    assert tenda.cache_stats == {'hits': 3, 'misses': 2, 'entries': 2}
+    assert tenda.stats['requests'] == 2
+    tenda.set_net_control(net_control)
+    tenda.get_net_control()
+    tenda.get_ipmac_bind(refresh=True)
+    tenda.get_vports()
+    assert tenda.stats['requests'] == 6
+
+
+def test_client_snapshot():
+    online_list = [{"deviceId": "AA:00:00:00:00:01", "ip": "192.168.1.120", "devName": "Phone", "line": "2"},
+                   {"deviceId": "aa:00:00:00:00:02", "ip": "192.168.1.101", "devName": "Laptop", "line": "1"}]
+    ipmac_bind = {'bindList': [{'ipaddr': '192.168.1.120', 'macaddr': 'aa:00:00:00:00:01', 'devname': 'phone', 'status': '1'},
+                               {'ipaddr': '192.168.1.150', 'macaddr': 'aa:00:00:00:00:03', 'devname': 'TV', 'status': '1'}]}
+    net_control = [{'netControlEn': '1'}, {'hostName': 'Laptop', 'ip': '192.168.1.101', 'mac': 'aa:00:00:00:00:02',
+                                           'limitUp': '10', 'limitDown': '20'}]
+    snapshot = tendawifi.ClientSnapshot(online_list, ipmac_bind, net_control)
+    assert len(snapshot) == 3
+    assert len(snapshot.online()) == 2
+    phone = snapshot.by_mac("aa:00:00:00:00:01")
+    assert phone['bind']['devname'] == 'phone' and phone['net_control'] is None
+    assert snapshot.by_ip("192.168.1.101")['net_control']['limitDown'] == '20'
+    assert snapshot.by_name("PHONE") == [phone]
+    assert [r['name'] for r in snapshot.find_name("t")] == ['Laptop', 'TV']
+    assert [r['ip'] for r in snapshot.by_iprange(101, 120)] == ['192.168.1.101', '192.168.1.120']
+    assert "AA:00:00:00:00:03" in snapshot
+
+
+def test_snapshot_from_router(mock_response, tenda):
+    snapshot = tenda.snapshot()
+    assert len(snapshot) == 1
+    assert tenda.stats['requests'] == 3
+
+
+def test_apply_skips_noop(mock_response, tenda):
+    diff = tenda.apply_ipmac_bind(RESP["GetIpMacBind"])
+    assert not diff.changed
+    assert tenda.stats['requests'] == 1
+    desired = {'virtualList': [{'ip': '192.168.1.101', 'inPort': '80', 'outPort': '80', 'protocol': '0'},
+                               {'ip': '192.168.1.100', 'inPort': '22', 'outPort': '2222', 'protocol': '0'}]}
+    diff = tendawifi.diff_vports(RESP["GetVports"], desired)
+    assert diff.added == [desired['virtualList'][1]]
+    assert diff.removed == [RESP["GetVports"]['virtualList'][1]]
+    assert diff.modified == [(RESP["GetVports"]['virtualList'][0], desired['virtualList'][0])]
+    net_control = [dict(row) for row in RESP["GetNetControl"]]
+    net_control[1]['limitDown'] = '500'
+    diff = tenda.apply_net_control(net_control)
+    assert diff.changed and len(diff.modified) == 1
+    assert tenda.stats['requests'] == 3
+
+
+def test_set_bandwidth_limits(monkeypatch, mock_response, tenda):
+    posts = []
+    monkeypatch.setattr(tenda, "set_net_control", posts.append)
+    diff = tenda.set_bandwidth_limits({'AA:BB:CC:DD:EE:FF': (0, 0)})
+    assert not diff.changed and not posts
+    diff = tenda.set_bandwidth_limits({'aa:bb:cc:dd:ee:ff': (10, 20), '11:22:33:44:55:66': (1, 2)})
+    assert len(diff.modified) == 1 and len(diff.added) == 1
+    assert [(row['limitUp'], row['limitDown']) for row in posts[0][1:]] == [('10', '20'), ('0', '0'), ('1', '2')]
+    assert tenda.stats['logins'] == 1
+
+
+def test_set_parent_control_many(mock_response, tenda):
+    r = tenda.set_parent_control_many(['aa:bb:cc:dd:ee:ff', '11:22:33:44:55:66'], 1)
+    assert r['aa:bb:cc:dd:ee:ff'] == '"errCode":0'
+    assert isinstance(r['11:22:33:44:55:66'], AssertionError)
+    assert tenda.stats == {'logins': 1, 'requests': 2}
+
+
+class FakeRouter:
+    _URL_BASE = "http://localhost"
+
+    def __init__(self, clock, delay=0):
+        self.clock = clock
+        self.delay = delay
+
+    def get_online_list(self, refresh=False):
+        # Polls take delay seconds of the fake clock, so tick scheduling doesn't depend on the machine load.
+        self.clock[0] += self.delay
+        return RESP["GetOnlineList"][1:]
+
+    def get_router_status(self, refresh=False):
+        return {"wanInfo": [{"wanUploadSpeed": "20.5", "wanDownloadSpeed": "648.8"}]}
+
+
+def test_poller():
+    batches = []
+    clock = [0]
+    poller = tendawifi.Poller(FakeRouter(clock), interval=0.01, maxlen=4, callback=batches.append,
+                              clock=lambda: clock[0], wall_clock=lambda: 1000 + clock[0])
+    samples = list(poller.samples(count=3))
+    assert len(samples) == 9 and len(batches) == 3
+    assert samples[-1] == tendawifi.WanSample(1000, "http://localhost", 20.5, 648.8)
+    assert isinstance(samples[0], tendawifi.ClientSample) and samples[0].upload_speed == 0.0
+    assert len(poller.buffer) == 4
+    assert poller.window(60) == list(poller.buffer)
+    assert poller.stats == {'polls': 3, 'skipped': 0, 'errors': 0}
+
+
+def test_poller_skips_overlapping_ticks():
+    clock = [0]
+    poller = tendawifi.Poller(FakeRouter(clock, delay=0.025), interval=0.01, wan=False,
+                              clock=lambda: clock[0], wall_clock=lambda: clock[0])
+    poller.run(count=6)
+    # Polls start at ticks 0 and 3, each overlapping the next two ticks.
+    assert poller.stats == {'polls': 2, 'skipped': 4, 'errors': 0}
+
+
+def test_presence_tracker():
+    phone = {"deviceId": "aa:00:00:00:00:01", "ip": "192.168.1.120", "devName": "Phone", "line": "2"}
+    laptop = {"deviceId": "aa:00:00:00:00:02", "ip": "192.168.1.101", "devName": "Laptop", "line": "1"}
+    tracker = tendawifi.PresenceTracker(leave_after=60)
+    assert [e.kind for e in tracker.update([phone, laptop], now=0)] == ['join', 'join']
+    assert tracker.update([phone, laptop], now=10) == []
+    assert tracker.update([phone], now=20) == []
+    assert tracker.update([phone, laptop], now=30) == []
+    moved = dict(phone, line="1")
+    events = tracker.update([moved], now=40)
+    assert [(e.kind, e.changes) for e in events] == [('change', {'line': ('2', '1')})]
+    events = tracker.update([moved], now=100)
+    assert [(e.kind, e.device_id) for e in events] == [('leave', "aa:00:00:00:00:02")]
+    assert list(tracker.online) == ["aa:00:00:00:00:01"]
+
+
+@ pytest.fixture
+def fake_router():
+    with FakeAC15(password="1234", clients=20) as router:
+        yield router
+
+
+def test_simulator_round_trip(fake_router):
+    with tendawifi.TendaAC15(fake_router.url, "1234") as tenda:
+        assert len(tenda.get_online_list()) == 20
+        tenda.set_bandwidth_limits({"02:00:00:00:00:01": (10, 20)})
+        assert tenda.snapshot().by_mac("02:00:00:00:00:01")["net_control"]["limitDown"] == "20"
+        bind = {'bindList': [{'ipaddr': '192.168.1.50', 'macaddr': '02:00:00:00:00:01', 'devname': 'Client1'}]}
+        assert not tenda.apply_ipmac_bind(bind).removed
+        assert tenda.get_ipmac_bind()['bindList'][0]['ipaddr'] == '192.168.1.50'
+        tenda.set_vports({'virtualList': [{'ip': '192.168.1.50', 'inPort': '22', 'outPort': '2222', 'protocol': '0'}]})
+        assert tenda.get_vports()['virtualList'][0]['outPort'] == '2222'
+        tenda.set_parent_control("02:00:00:00:00:01", 1, time="07:00-22:00")
+        assert tenda.get_parent_control("02:00:00:00:00:01")["time"] == "07:00-22:00"
+        tenda.set_router_password("1234", "1234")
+        fake_router.expire_sessions()
+        assert tenda.get_router_status()["deviceName"] == "AC15"
+        assert tenda.stats['logins'] == fake_router.stats['logins'] == 2
+
+
+def test_simulator_error_injection(monkeypatch, fake_router):
+    monkeypatch.setattr(tendawifi.time, "sleep", lambda s: None)
+    fake_router.error_rate = 0.3
+    with tendawifi.TendaAC15(fake_router.url, "1234") as tenda:
+        for _ in range(10):
+            assert tenda.get_router_status()["deviceName"] == "AC15"
+    assert fake_router.stats['errors'] > 0
+    with tendawifi.TendaAC15(fake_router.url, "wrong") as tenda:
+        with pytest.raises(AssertionError):
+            tenda.get_online_list()
+
+
+def test_observers_and_collector(monkeypatch, fake_router):
+    monkeypatch.setattr(tendawifi.time, "sleep", lambda s: None)
+    events = []
+    collector = tendawifi.LatencyCollector()
+    with tendawifi.TendaAC15(fake_router.url, "1234", observers=[events.append, collector]) as tenda:
+        tenda.get_online_list()
+        fake_router.error_rate = 1
+        with pytest.raises(requests.HTTPError):
+            tenda.get_router_status()
+    assert [(e.kind, e.endpoint, e.attempt) for e in events[:5]] == [
+        ('request_start', 'login', 1), ('request_end', 'login', 1), ('login', 'login', 0),
+        ('request_start', 'GetOnlineList', 1), ('request_end', 'GetOnlineList', 1)]
+    assert events[4].status == 200 and events[4].bytes > 1000 and events[4].duration > 0
+    assert [e.kind for e in events[5:]] == ['request_start', 'retry'] * 2 + ['request_start', 'failure']
+    assert events[-1].status == 500
+    text = collector.to_prometheus()
+    assert f'tendawifi_request_duration_seconds_count{{router="{fake_router.url}",endpoint="GetOnlineList"}} 1' in text
+    assert f'tendawifi_retries_total{{router="{fake_router.url}",endpoint="GetRouterStatus"}} 2' in text
+    assert f'tendawifi_failures_total{{router="{fake_router.url}",endpoint="GetRouterStatus"}} 1' in text
+    assert collector.summary()[(fake_router.url, 'login')]['count'] == 1
+
+
+def test_circuit_breaker(monkeypatch):
+    monkeypatch.setattr(tendawifi.time, "sleep", lambda s: None)
+    calls = []
+
+    def refused(self, method, url, **kwargs):
+        calls.append(kwargs["timeout"])
+        raise requests.ConnectionError("Connection refused")
+    monkeypatch.setattr(requests.Session, "request", refused)
+    policy = tendawifi.RetryPolicy(tries=2, timeouts={'login': (1, 2)}, failure_threshold=2, reset_timeout=60)
+    tenda = tendawifi.TendaAC15("http://localhost", "1234", retry=policy)
+    for _ in range(2):
+        with pytest.raises(requests.ConnectionError):
+            tenda.get_online_list()
+    assert calls == [(1, 2)] * 4
+    with pytest.raises(tendawifi.CircuitOpenError):
+        tenda.get_online_list()
+    assert len(calls) == 4
+    tenda._breaker._opened_at -= 60
+    with pytest.raises(requests.ConnectionError):
+        tenda.get_online_list()
+    assert len(calls) == 6 and tenda._breaker.state == 'open'
+
+
+def test_circuit_breaker_cancelled_probe():
+    pytest.importorskip("aiohttp")
+    from aiohttp import web
+    from tendawifi.aio import AsyncTendaAC15
+    logins = []
+
+    async def login(request):
+        logins.append(1)
+        if len(logins) == 1:
+            await asyncio.sleep(1)
+        resp = web.Response(status=302, headers={"Location": "/main.html"})
+        resp.set_cookie("password", "abc")
+        return resp
+
+    async def online_list(request):
+        return web.json_response(RESP["GetOnlineList"])
+
+    async def main():
+        app = web.Application()
+        app.router.add_post("/login/Auth", login)
+        app.router.add_get("/goform/getOnlineList", online_list)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        policy = tendawifi.RetryPolicy(tries=1, failure_threshold=1, reset_timeout=60)
+        client = AsyncTendaAC15(f"http://127.0.0.1:{port}", "1234", retry=policy)
+        try:
+            client._breaker.record_failure()
+            client._breaker._opened_at -= 60
+            # The half-open probe is cancelled before it can record its outcome.
+            with pytest.raises(asyncio.TimeoutError):
+                await asyncio.wait_for(client.get_online_list(), 0.1)
+            assert client._breaker.state == 'half_open'
+            with pytest.raises(tendawifi.CircuitOpenError):
+                await client.get_online_list()
+            client._breaker._opened_at -= 60
+            return await client.get_online_list(), client._breaker.state
+        finally:
+            await client.close()
+            await runner.cleanup()
+
+    assert asyncio.run(main()) == (RESP["GetOnlineList"][1:], 'closed')
+
+
+def test_retry_deadline(monkeypatch):
+    clock = [0]
+    monkeypatch.setattr(tendawifi.time, "monotonic", lambda: clock[0])
+    monkeypatch.setattr(tendawifi.time, "sleep", lambda s: clock.__setitem__(0, clock[0] + s))
+    timeouts = []
+
+    def refused(self, method, url, **kwargs):
+        timeouts.append(kwargs["timeout"])
+        clock[0] += 0.5
+        raise requests.ConnectionError("Connection refused")
+    monkeypatch.setattr(requests.Session, "request", refused)
+    policy = tendawifi.RetryPolicy(tries=10, delay=1, backoff=1, jitter=0, deadline=4, timeout=(3, 3))
+    tenda = tendawifi.TendaAC15("http://localhost", "1234", retry=policy)
+    with pytest.raises(requests.ConnectionError):
+        tenda.get_online_list()
+    assert timeouts == [(3, 3), (2.5, 2.5), (1, 1)]
+
+
+def test_retry_deadline_includes_login(monkeypatch):
+    clock = [0]
+    monkeypatch.setattr(tendawifi.time, "monotonic", lambda: clock[0])
+    monkeypatch.setattr(tendawifi.time, "sleep", lambda s: clock.__setitem__(0, clock[0] + s))
+    timeouts = []
+
+    def slow_login(self, method, url, **kwargs):
+        timeouts.append(kwargs["timeout"])
+        clock[0] += 1.5
+        if url.endswith("/login/Auth"):
+            r = requests.Response()
+            r.status_code = 302
+            r.cookies.set("password", "abc")
+            return r
+        raise requests.ConnectionError("Connection refused")
+    monkeypatch.setattr(requests.Session, "request", slow_login)
+    policy = tendawifi.RetryPolicy(tries=10, delay=1, backoff=1, jitter=0, deadline=4, timeout=(3, 3))
+    tenda = tendawifi.TendaAC15("http://localhost", "1234", retry=policy)
+    with pytest.raises(requests.ConnectionError):
+        tenda.get_online_list()
+    # The GET only gets what the login left of the deadline.
+    assert timeouts == [(3, 3), (2.5, 2.5)]
+
+
+def test_lazy_credentials(monkeypatch, mock_response):
+    monkeypatch.setattr(tendawifi.credentials, "getpass", lambda *a: pytest.fail("getpass called"))
+    monkeypatch.delenv("TENDA_PASSWORD", raising=False)
+    tenda = tendawifi.TendaAC15("http://localhost")
+    assert tenda._http is None and tenda._auth_data is None
+    with pytest.raises(ValueError):
+        tenda.get_vports()
+    monkeypatch.setenv("TENDA_PASSWORD", "1234")
+    assert tenda.get_vports() == RESP["GetVports"]
+
+    class Keyring:
+        def get_password(self, service, username):
+            return {("tendawifi", "http://localhost"): "5678"}[(service, username)]
+    assert tendawifi.TendaAC15("http://localhost", Keyring())._AUTH_DATA["password"] == hashlib.md5(b"5678").hexdigest()
+    assert tendawifi.TendaAC15("http://localhost", lambda: "90")._AUTH_DATA["password"] == hashlib.md5(b"90").hexdigest()
+
+
+def test_typed_models(fake_router):
+    from ipaddress import IPv4Address
+    from tendawifi import models
+    with tendawifi.TendaAC15(fake_router.url, "1234") as tenda:
+        online = models.parse_online_list(tenda.get_online_list())
+        assert len(online) == 20 and isinstance(online[0].ip, IPv4Address)
+        assert isinstance(online[0].upload_speed, float) and online[0].guest is False
+        assert not hasattr(online[0], '__dict__')
+        status = models.parse_router_status(tenda.get_router_status())
+        assert status.client_count == 20 and str(status.wan[0].ip) == "10.0.0.2"
+        assert status.lan_mac == "cc:2d:21:00:00:01" and status.wifi_5g_enabled is True
+        raw = tenda.get_net_control()
+        rows = models.parse_net_control(raw)
+        assert models.net_control_payload(rows) == raw
+        rows[0].limit_down = 512
+        tenda.set_net_control(models.net_control_payload(rows))
+        assert models.parse_net_control(tenda.get_net_control())[0].limit_down == 512
+        raw = tenda.get_ipmac_bind()
+        assert models.ipmac_bind_payload(models.parse_ipmac_bind(raw))["bindList"] == raw["bindList"]
+        rule = models.VirtualServer(IPv4Address("192.168.1.10"), 80, 8080, 0)
+        tenda.set_vports(models.vports_payload([rule]))
+        assert models.parse_vports(tenda.get_vports()) == [rule]
+
+
+def test_codec_rejects_reserved_characters():
+    from tendawifi import codec
+    assert codec.NET_CONTROL.encode([]) == ""
+    assert codec.VPORTS.encode([{"ip": "192.168.1.2", "inPort": 80, "outPort": 8080, "protocol": 0}]) == "192.168.1.2,80,8080,0"
+    for bad in ("a\rb", "a\nb", "a~b"):
+        with pytest.raises(ValueError):
+            codec.IPMAC_BIND.encode([{"devname": bad, "macaddr": "aa:bb:cc:dd:ee:ff", "ipaddr": "192.168.1.2"}])
+    with pytest.raises(ValueError):
+        codec.VPORTS.encode([{"ip": "192.168.1.2,", "inPort": 80, "outPort": 8080, "protocol": 0}])
+    with pytest.raises(ValueError):
+        codec.NET_CONTROL.decode("name\raa:bb:cc:dd:ee:ff\r0\n")
+
+
+@ pytest.mark.parametrize("seed", range(3))
+def test_codec_round_trip(seed, fake_router):
+    import random
+    rng = random.Random(seed)
+    chars = "abcXYZ 0123-_.,&=%+/\\'\"ñé漢\t"
+
+    def name():
+        return "".join(rng.choice(chars) for _ in range(rng.randint(0, 16)))
+
+    def mac(i):
+        return ":".join("%02x" % b for b in (2, seed, i >> 8, i & 255, rng.randrange(256), rng.randrange(256)))
+    bind_list = [{"ipaddr": f"192.168.{i // 250}.{i % 250 + 2}", "macaddr": mac(i), "devname": name(), "status": "1"}
+                 for i in range(rng.randint(1, 300))]
+    from tendawifi import codec
+    assert codec.IPMAC_BIND.decode(codec.IPMAC_BIND.encode(bind_list)) == \
+        [{k: b[k] for k in codec.IPMAC_BIND.fields} for b in bind_list]
+    rows = [{"hostName": name(), "mac": mac(i), "limitUp": str(rng.randrange(10000)),
+             "limitDown": str(rng.randrange(10000))} for i in range(rng.randint(1, 300))]
+    with tendawifi.TendaAC15(fake_router.url, "1234") as tenda:
+        tenda.set_ipmac_bind({"bindList": bind_list})
+        assert tenda.get_ipmac_bind()["bindList"] == bind_list
+        tenda.set_net_control([{"netControlEn": "1"}] + rows)
+        written = {r["mac"]: r for r in tenda.get_net_control()[1:] if r["isSet"] == "1"}
+        assert [{k: written[r["mac"]][k] for k in r} for r in rows] == rows
+
+
+def test_export_import_config(tmp_path, fake_router):
+    path = str(tmp_path / "router.json")
+    with tendawifi.TendaAC15(fake_router.url, "1234") as tenda:
+        tenda.set_ipmac_bind({"bindList": [{"devname": "pc", "macaddr": "02:00:00:00:00:01", "ipaddr": "192.168.1.50"}]})
+        tenda.set_vports({"virtualList": [{"ip": "192.168.1.50", "inPort": "22", "outPort": "2222", "protocol": "0"}]})
+        tenda.set_bandwidth_limits({"02:00:00:00:00:02": (64, 512)})
+        tenda.set_parent_control("02:00:00:00:00:03", 1, "07:00-22:00")
+        config = tenda.export_config(path)
+    assert config["version"] == 1 and len(config["parent_control"]) == 20
+    assert config["parent_control"]["02:00:00:00:00:03"]["time"] == "07:00-22:00"
+
+    with FakeAC15(password="1234", clients=20) as replacement:
+        with tendawifi.TendaAC15(replacement.url, "1234") as tenda:
+            results = tenda.import_config(path)
+            assert [s for s in results if s != "parent_control"] == ["ipmac_bind", "vports", "net_control"]
+            assert list(results["parent_control"]) == ["02:00:00:00:00:03"]
+            assert tenda.get_parent_control("02:00:00:00:00:03")["time"] == "07:00-22:00"
+            assert tenda.get_ipmac_bind()["bindList"] == config["ipmac_bind"]["bindList"]
+            results = tenda.import_config(config)
+            assert not any(d.changed for s, d in results.items() if s != "parent_control")
+            assert results["parent_control"] == {}
+    with pytest.raises(ValueError):
+        tendawifi.TendaAC15(fake_router.url, "1234").import_config(dict(config, version=99))
+
+
+def test_cli(tmp_path, fake_router):
+    import io
+    import json
+    from tendawifi import cli
+    inventory = tmp_path / "routers.json"
+    with FakeAC15(password="5678", clients=3) as other:
+        inventory.write_text(json.dumps({"routers": [
+            {"name": "office", "url": fake_router.url, "password": "1234", "tags": ["site-a"]},
+            {"name": "store", "url": other.url, "password": "5678", "tags": ["site-b"]},
+            {"name": "down", "url": "http://127.0.0.1:9", "password": "1234", "tags": ["site-b"]}]}))
+        out = io.StringIO()
+        assert cli.main(["-i", str(inventory), "--select", "site-a", "--select", "store", "online"], out) == 0
+        lines = {line["router"]: line for line in map(json.loads, out.getvalue().splitlines())}
+        assert len(lines["office"]["result"]) == 20 and len(lines["store"]["result"]) == 3
+        out = io.StringIO()
+        assert cli.main(["-i", str(inventory), "--select", "site-b", "-p", "2", "--tries", "1",
+                         "call", "set_wps_status", "1"], out) == 1
+        lines = {line["router"]: line for line in map(json.loads, out.getvalue().splitlines())}
+        assert lines["store"]["ok"] and not lines["down"]["ok"] and "error" in lines["down"]
+        assert other.forms["SetWPS"]["wpsEn"] == "1"
+        out = io.StringIO()
+        assert cli.main(["-i", str(inventory), "-s", "office", "export", str(tmp_path / "backup")], out) == 0
+        assert json.loads((tmp_path / "backup" / "office.json").read_text())["version"] == 1
+        inventory.write_text(json.dumps([{"name": "../../evil", "url": fake_router.url, "password": "1234"},
+                                          {"url": other.url, "password": "5678"}]))
+        assert cli.main(["-i", str(inventory), "export", str(tmp_path / "backup")], io.StringIO()) == 0
+        assert sorted(p.name for p in (tmp_path / "backup").iterdir()) == \
+            ["_.._evil.json", f"http___127.0.0.1_{other.port}.json", "office.json"]
+        assert not (tmp_path.parent / "evil.json").exists()
+
+
+def test_history_store():
+    from tendawifi.history import HistoryStore
+    from tendawifi.telemetry import ClientSample, WanSample
+    store = HistoryStore(interval=10, batch_size=50, retention=86400, downsampling=[(3600, 600)], clock=lambda: 100000)
+    for t in range(0, 100000, 10):
+        store.add([ClientSample(t, "r1", "aa", "192.168.1.2", "laptop", 1.0, 10.0),
+                   ClientSample(t, "r1", "bb", "192.168.1.3", "phone", 2.0, 2.0),
+                   WanSample(t, "r1", 3.0, 12.0)])
+    store.add([ClientSample(100000 - 5, "r1", "bb", "192.168.1.4", "phone2", 0.0, 0.0)])
+    assert store.count() == {'clients': 20001, 'wan': 10000}
+    assert [(t.device_id, t.upload, t.download) for t in store.top_talkers(since=90000, limit=1)] == [("aa", 10000, 100000)]
+    removed = store.compact()
+    assert removed["expired"] == 3 * 1360 and store.count() == {'clients': 2 * 538 + 1, 'wan': 538}
+    totals = {t.device_id: t for t in store.device_totals(until=96000)}
+    assert totals["aa"].download == 10.0 * (96000 - 13600) and totals["aa"].seconds == 96000 - 13600
+    assert totals["bb"].name == "phone2" and totals["bb"].ip == "192.168.1.4"
+    assert store.compact()["downsampled"] == 0
+    assert store.wan_series("r1", since=94800, until=96000, bucket=600) == [(94800, 3.0, 12.0), (95400, 3.0, 12.0)]
+    store.close()
+
+
+def test_rolling_reboot():
+    from tendawifi.maintenance import RollingReboot
+    policy = tendawifi.RetryPolicy(tries=1, timeout=(1, 1))
+    routers = [FakeAC15(password="1234", clients=2, reboot_time=0.2, wan_time=0.1).start() for _ in range(3)]
+    try:
+        clients = [("site-a", tendawifi.TendaAC15(r.url, "1234", retry=policy)) for r in routers[:2]] + \
+            [("site-b", tendawifi.TendaAC15(routers[2].url, "1234", retry=policy))]
+        rolling = RollingReboot(clients, per_site=1, initial_delay=0.05, delay=0.05, backoff=1.5)
+        start = time.monotonic()
+        results = rolling.run()
+        elapsed = time.monotonic() - start
+        assert [r.error for r in results.values()] == [None] * 3
+        assert all(0.3 <= r.downtime < 1 for r in results.values())
+        # Both site-a routers were rebooted one after the other, site-b alongside them.
+        assert sum(results[r.url].downtime for r in routers[:2]) <= elapsed < 2 * 1.0
+        results = RollingReboot(clients, per_site=1, budget=0.1, initial_delay=0.05, delay=0.05).run()
+        assert results[routers[1].url].downtime is None and isinstance(results[routers[1].url].error, TimeoutError)
+    finally:
+        for r in routers:
+            r.stop()
+
+
+def test_rolling_reboot_waits_for_shutdown():
+    from tendawifi.maintenance import RollingReboot
+    policy = tendawifi.RetryPolicy(tries=1, timeout=(1, 1))
+    with FakeAC15(clients=2, reboot_time=0.2, shutdown_delay=0.3) as slow, FakeAC15(clients=2) as never:
+        rolling = RollingReboot([tendawifi.TendaAC15(slow.url, "1234", retry=policy),
+                                 tendawifi.TendaAC15(never.url, "1234", retry=policy)],
+                                router_timeout=0.6, initial_delay=0.05, delay=0.05, backoff=1)
+        results = rolling.run()
+    # The status polls before the delayed shutdown still had WAN up.
+    assert results[slow.url].error is None and results[slow.url].downtime >= 0.5
+    assert results[never.url].downtime is None and "never went down" in str(results[never.url].error)
+
+
+def test_rolling_reboot_default_policy():
+    from tendawifi.maintenance import RollingReboot
+    with FakeAC15(clients=2, reboot_time=0.3) as router:
+        # The default policy retries for seconds, longer than the reboot and the budget.
+        rolling = RollingReboot([tendawifi.TendaAC15(router.url, "1234")], budget=1.5, router_timeout=1.5,
+                                initial_delay=0.05, delay=0.05, backoff=1)
+        start = time.monotonic()
+        results = rolling.run()
+        elapsed = time.monotonic() - start
+    assert results[router.url].error is None and 0.3 <= results[router.url].downtime < 0.5
+    assert elapsed < 1
+
+
+def test_single_flight_and_concurrency_cap(fake_router):
+    import threading
+    from concurrent.futures import ThreadPoolExecutor
+    fake_router.latency = 0.05
+    in_flight, peak, lock = [0], [0], threading.Lock()
+
+    def observer(event):
+        with lock:
+            if event.kind == 'request_start':
+                in_flight[0] += 1
+                peak[0] = max(peak[0], in_flight[0])
+            elif event.kind in ('request_end', 'failure', 'retry'):
+                in_flight[0] -= 1
+    with tendawifi.TendaAC15(fake_router.url, "1234", observers=[observer], max_concurrent=2) as tenda:
+        with ThreadPoolExecutor(8) as pool:
+            results = list(pool.map(lambda _: tenda.get_online_list(), range(8)))
+        assert fake_router.stats['logins'] == 1 and fake_router.stats['requests'] == 2
+        assert all(r == results[0] and r is not results[0] for r in results[1:])
+        assert tenda._gets.shared == 7
+        endpoints = ['get_vports', 'get_net_control', 'get_ipmac_bind', 'get_router_status', 'get_online_list']
+        with ThreadPoolExecutor(5) as pool:
+            list(pool.map(lambda name: getattr(tenda, name)(), endpoints))
+        assert peak[0] == 2
+
+
+def test_client_table():
+    np = pytest.importorskip("numpy")
+    from tendawifi.analytics import ClientTable, status_table
+    from tendawifi.simulator import make_clients
+    lists = {"r1": make_clients(30, seed=1), "r2": make_clients(50, seed=2), "r3": []}
+    net_control = [{"netControlEn": "1"}, {"mac": lists["r2"][3]["deviceId"].upper(), "limitUp": "64", "limitDown": "512"}]
+    table = ClientTable.from_online_lists(lists, {"r2": net_control})
+    assert len(table) == 80 and table["download"].dtype == np.float64
+    downloads = {r: sum(float(c["downloadSpeed"]) for c in lst) for r, lst in lists.items() if lst}
+    assert table.group_by("router", "download", "sum") == pytest.approx(downloads)
+    by_band = table.group_by(("router", "line"), "upload", "count")
+    assert sum(by_band.values()) == 80 and all(key[0] in ("r1", "r2") for key in by_band)
+    guests = sum(c["isGuestClient"] == "true" for lst in lists.values() for c in lst)
+    assert table.group_by("guest", "download", "count") == {False: 80 - guests, True: guests}
+    assert table.where(table["limit_down"] > 0)["mac"].tolist() == [lists["r2"][3]["deviceId"].lower()]
+    top = table.top("download", 3)
+    assert [row["download"] for row in top] == sorted(table["download"], reverse=True)[:3]
+    assert top[0]["router"] in ("r1", "r2") and isinstance(top[0]["name"], str)
+    p = table.percentile("download", [50, 90], by="router")
+    assert p["r2"] == pytest.approx(np.percentile([float(c["downloadSpeed"]) for c in lists["r2"]], [50, 90]).tolist())
+    assert table.group_by("router", "upload", "max")["r1"] == max(float(c["uploadSpeed"]) for c in lists["r1"])
+    status = status_table({"r1": {"clientNum": 3, "wanInfo": [{"wanIp": "10.0.0.2", "wanUploadSpeed": "1.5",
+                                                                "wanDownloadSpeed": "2"}]}, "r2": {"wanInfo": []}})
+    assert status["wan_up"].tolist() == [True, False] and status["download"].tolist() == [2.0, 0.0]
+
+
+def test_probe(fake_router):
+    import socket
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        closed_url = "http://127.0.0.1:%d" % s.getsockname()[1]
+    tenda = tendawifi.TendaAC15(fake_router.url, "1234")
+    result = tenda.probe()
+    assert result.ok and result.tcp is not None and result.http is not None and result.session_valid is None
+    assert fake_router.stats["logins"] == 0
+    result = tenda.probe(login=True)
+    assert result.ok and result.session_valid and result.session > 0 and tenda.stats["logins"] == 1
+    fake_router.expire_sessions()
+    result = tenda.probe()
+    assert result.ok and result.session_valid is False and result.session is None and result.error is None
+    for _ in range(3):
+        result = tenda.probe(login=True)
+        assert result.ok and result.session_valid and result.error is None
+    assert fake_router.stats["logins"] == 2
+    fake_router.expire_sessions()
+    result = tenda.probe(login=True)
+    assert result.ok and result.session_valid and fake_router.stats["logins"] == 3
+    fake_router.latency = 0.5
+    start = time.monotonic()
+    with tendawifi.TendaFleet([tenda, (closed_url, "1234")], max_workers=1) as fleet:
+        results = fleet.probe(deadline=0.3)
+    assert time.monotonic() - start < 0.6
+    assert isinstance(results[fake_router.url].error, Exception) and results[fake_router.url].tcp is not None
+    assert isinstance(results[closed_url].error, OSError) and results[closed_url].tcp is None
+
+
+def test_fleet_probe_workers(monkeypatch):
+    import threading
+    in_flight, peak, lock = [0], [0], threading.Lock()
+
+    def probe(self, deadline, login):
+        with lock:
+            in_flight[0] += 1
+            peak[0] = max(peak[0], in_flight[0])
+        time.sleep(0.02)
+        with lock:
+            in_flight[0] -= 1
+        return self._URL_BASE
+    monkeypatch.setattr(tendawifi.TendaAC15, "probe", probe)
+    urls = [f"http://10.0.0.{i}" for i in range(6)]
+    with tendawifi.TendaFleet([(url, "1234") for url in urls], probe_workers=2) as fleet:
+        assert fleet.probe() == {url: url for url in urls}
+    assert peak[0] == 2
+
+
+def test_policy_engine_retries_failed_apply():
+    from datetime import datetime, timedelta
+    from tendawifi.policy import Policy, PolicyEngine
+    mac = "aa:00:00:00:00:01"
+    net_control = [{"netControlEn": "1"}, {"hostName": "Phone", "mac": mac, "limitUp": "0", "limitDown": "0"}]
+    written, reads = [], []
+
+    class FlakyRouter:
+        _URL_BASE = "http://localhost"
+
+        def get_net_control(self, refresh=False):
+            reads.append(refresh)
+            if len(reads) == 1:
+                raise requests.ConnectionError("Connection refused")
+            return net_control
+
+        def set_net_control(self, rows):
+            written.append(rows)
+
+    class Waits(list):
+        def wait(self, seconds):
+            self.append(seconds)
+            clock[0] += timedelta(seconds=seconds)
+            return False
+
+        def clear(self):
+            pass
+
+    clock = [datetime(2021, 3, 1, 21)]
+    policy = Policy.from_dict({"groups": {"kids": [mac]},
+                               "limits": [{"group": "kids", "up": 64, "down": 256, "time": "21:00-07:00"}]})
+    engine = PolicyEngine(FlakyRouter(), policy, retry_delay=5, clock=lambda: clock[0])
+    engine._stop = waits = Waits()
+    engine.run(count=2)
+    # The limit starting at 21:00 is written 5 seconds later, not at the next reconcile.
+    assert waits == [5] and len(reads) == 2
+    assert written[0][1]["limitDown"] == "256" and len(written) == 1
+    assert engine.stats == {'applies': 1, 'writes': 1, 'errors': 1}
+
+
+def test_policy_engine(fake_router):
+    from datetime import datetime
+    from tendawifi.policy import Policy, PolicyEngine, Window
+    night = Window("21:00-07:00", "sun-thu")
+    assert night.contains(datetime(2021, 3, 1, 23)) and night.contains(datetime(2021, 3, 2, 6, 59))  # Monday night
+    assert not night.contains(datetime(2021, 3, 5, 23)) and not night.contains(datetime(2021, 3, 1, 12))  # Friday
+    assert night.contains(datetime(2021, 3, 6, 6)) is False and night.contains(datetime(2021, 3, 8, 6))
+    assert night.next_transition(datetime(2021, 3, 5, 12)) == datetime(2021, 3, 7, 21)
+    assert Window("07:00-22:00", "mon-fri").router_days() == "0,1,1,1,1,1,0"
+    kids = [c["deviceId"] for c in fake_router.online_list[:2]]
+    policy = Policy.from_dict({
+        "groups": {"kids": kids, "guests": ["aa:bb:cc:00:00:01"]},
+        "limits": [{"group": "guests", "up": 128, "down": 1024},
+                   {"group": "kids", "up": 64, "down": 256, "time": "21:00-07:00", "days": "sun-thu"}],
+        "access": [{"group": "kids", "time": "07:00-22:00", "days": "mon-fri"}]})
+    assert policy.next_transition(datetime(2021, 3, 1, 12)) == datetime(2021, 3, 1, 21)
+    with tendawifi.TendaAC15(fake_router.url, "1234", cache_ttl=600) as tenda:
+        engine = PolicyEngine(tenda, policy)
+        result = engine.apply(datetime(2021, 3, 1, 12), refresh=True)
+        assert result["limits"].changed and sorted(result["parent_control"]) == sorted(kids)
+        limits = {row["mac"]: (row["limitUp"], row["limitDown"]) for row in tenda.get_net_control()[1:]}
+        assert limits["aa:bb:cc:00:00:01"] == ("128", "1024") and limits[kids[0]] == ("0", "0")
+        assert tenda.get_parent_control(kids[0])["day"] == "0,1,1,1,1,1,0"
+        requests_before = tenda.stats["requests"]
+        result = engine.apply(datetime(2021, 3, 1, 13))
+        assert not result["limits"].changed and not result["parent_control"]
+        assert tenda.stats["requests"] == requests_before  # served by the cache, nothing written
+        result = engine.apply(datetime(2021, 3, 1, 21, 30))
+        assert result["limits"].changed and not result["parent_control"]
+        assert {row["mac"]: row["limitDown"] for row in tenda.get_net_control()[1:]}[kids[1]] == "256"
+        tenda.set_parent_control(kids[0], 0)
+        assert list(engine.apply(datetime(2021, 3, 1, 21, 45), refresh=True)["parent_control"]) == [kids[0]]
+        assert engine.stats == {'applies': 4, 'writes': 5, 'errors': 0}
+        PolicyEngine(tenda, policy, clock=lambda: datetime(2021, 3, 2, 8)).run(count=1)
+        assert {row["mac"]: row["limitDown"] for row in tenda.get_net_control(refresh=True)[1:]}[kids[1]] == "0"